@@ -0,0 +1,236 @@
+import io
+import os
+import sys
+import json
+import time
+import platform
+import statistics
+import tracemalloc
+import multiprocessing
+from bs4 import BeautifulSoup
+from extract_story_structure import extract_story_structure, extract_all_story_structures, SIDE_STORY_TAB
+from extract_en_story_structure import extract_en_story_structure, extract_en_story_structure_fast
+from story_parser import (
+    parse_chinese_dialogue,
+    parse_english_dialogue,
+    parse_chinese_html_fast,
+    parse_english_html_fast,
+)
+
+try:
+    import resource
+except ImportError:  # Windows没有resource模块，只统计Python堆内存
+    resource = None
+
+
+HTML_DIR = "html"
+BASELINE_PATH = "benchmark_baseline.json"
+
+DEFAULT_REPEAT = 5
+# 比基线慢多少倍视为性能回退
+DEFAULT_THRESHOLD = 1.5
+
+
+# 每个测试用例：(fixture文件, {后端名: 解析函数})
+# bs4-html.parser / bs4-lxml 是BeautifulSoup分别使用两种解析器，lxml是直接用lxml解析，lxml-stream是iterparse流式解析
+CASES = {
+    "cn_structure": ("storys.html", {
+        "bs4-html.parser": lambda html: extract_story_structure(html, "html.parser"),
+        "bs4-lxml": lambda html: extract_story_structure(html, "lxml"),
+        # 流式提取一次得到所有标签页，这里只取支线部分和其他后端比较
+        "lxml-stream": lambda html: {
+            "side_story": extract_all_story_structures(io.BytesIO(html.encode("utf-8")))[SIDE_STORY_TAB]
+        },
+    }),
+    "en_structure": ("fandom_storys.html", {
+        "bs4-html.parser": lambda html: extract_en_story_structure(html, "html.parser"),
+        "bs4-lxml": lambda html: extract_en_story_structure(html, "lxml"),
+        "lxml": extract_en_story_structure_fast,
+    }),
+    "cn_dialogue": ("story.html", {
+        "bs4-html.parser": lambda html: parse_chinese_dialogue(BeautifulSoup(html, "html.parser")),
+        "bs4-lxml": lambda html: parse_chinese_dialogue(BeautifulSoup(html, "lxml")),
+        "lxml": parse_chinese_html_fast,
+    }),
+    "en_dialogue": ("fandom_story.html", {
+        "bs4-html.parser": lambda html: parse_english_dialogue(BeautifulSoup(html, "html.parser")),
+        "bs4-lxml": lambda html: parse_english_dialogue(BeautifulSoup(html, "lxml")),
+        "lxml": parse_english_html_fast,
+    }),
+}
+
+
+def read_fixture(filename):
+    with open(os.path.join(HTML_DIR, filename), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def max_rss():
+    """进程的峰值常驻内存（字节），没有resource模块时返回None"""
+    # Linux上ru_maxrss会继承父进程的峰值，优先读取/proc中本进程的VmHWM
+    if os.path.exists("/proc/self/status"):
+        with open("/proc/self/status", 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux上单位是KB，macOS上是字节
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
+def measure_memory(case_name, backend):
+    """在子进程中执行一次解析，返回 (Python堆峰值, 进程常驻内存峰值)
+
+    lxml和libxml2的内存不经过Python分配器，tracemalloc统计不到，
+    所以另外记录干净子进程的峰值常驻内存（包含导入模块的固定开销，用于横向比较）。
+    """
+    filename, backends = CASES[case_name]
+    html = read_fixture(filename)
+    parse = backends[backend]
+    tracemalloc.start()
+    parse(html)
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return python_peak, max_rss()
+
+
+def run_case(case_name, backend, repeat):
+    filename, backends = CASES[case_name]
+    html = read_fixture(filename)
+    size = len(html.encode("utf-8"))
+    parse = backends[backend]
+
+    # 预热一次，同时取输出用于比较各后端结果是否一致
+    result = parse(html)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(html)
+        timings.append(time.perf_counter() - start)
+
+    # 内存统计放到独立进程，避免前面的解析抬高峰值，也避免tracemalloc拖慢计时
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        python_peak, rss_peak = pool.apply(measure_memory, (case_name, backend))
+
+    median = statistics.median(timings)
+    return result, {
+        "fixture": filename,
+        "bytes": size,
+        "repeat": repeat,
+        "median_seconds": round(median, 6),
+        "min_seconds": round(min(timings), 6),
+        "pages_per_second": round(1 / median, 2),
+        "mb_per_second": round(size / median / 1e6, 2),
+        "python_peak_bytes": python_peak,
+        "rss_peak_bytes": rss_peak,
+    }
+
+
+def run_benchmarks(case_names=None, repeat=DEFAULT_REPEAT):
+    results = {}
+    for case_name in case_names or CASES:
+        _, backends = CASES[case_name]
+        reference = None
+        for backend in backends:
+            print(f"运行 {case_name} / {backend} ...")
+            output, stats = run_case(case_name, backend, repeat)
+            # 以第一个后端的输出为准，标记结果不一致的后端
+            if reference is None:
+                reference = output
+            stats["matches_reference"] = output == reference
+            results[f"{case_name}/{backend}"] = stats
+    return results
+
+
+def print_results(results):
+    print(f"\n{'用例':<34}{'页/秒':>10}{'MB/秒':>10}{'中位耗时(ms)':>14}{'Python堆(MB)':>14}{'RSS峰值(MB)':>13}  一致")
+    for name, stats in results.items():
+        rss = f"{stats['rss_peak_bytes'] / 1e6:.1f}" if stats["rss_peak_bytes"] is not None else "-"
+        print(
+            f"{name:<34}{stats['pages_per_second']:>10.2f}{stats['mb_per_second']:>10.2f}"
+            f"{stats['median_seconds'] * 1000:>14.1f}{stats['python_peak_bytes'] / 1e6:>14.1f}{rss:>13}"
+            f"  {'是' if stats['matches_reference'] else '否'}"
+        )
+
+
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    baseline = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    print(f"\n基线已保存到 {path}")
+
+
+def compare_with_baseline(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """和基线比较最短耗时，返回回退的用例列表
+
+    最短耗时受系统负载的干扰最小；计时和机器有关，基线应在同一台机器上生成后再比较。
+    """
+    regressions = []
+    for name, stats in results.items():
+        previous = baseline["results"].get(name)
+        if not previous:
+            continue
+        ratio = stats["min_seconds"] / previous["min_seconds"]
+        if ratio > threshold:
+            regressions.append((name, ratio))
+        if previous.get("matches_reference") and not stats["matches_reference"]:
+            regressions.append((name, None))
+    return regressions
+
+
+def main():
+    # 用法: python benchmark.py [用例名 ...] [--repeat N] [--threshold 1.5] [--save]
+    # 默认和benchmark_baseline.json比较，有回退时返回非零退出码；--save 把本次结果保存为新的基线
+    args = sys.argv[1:]
+    save = "--save" in args
+    if save:
+        args.remove("--save")
+    options = {"--repeat": DEFAULT_REPEAT, "--threshold": DEFAULT_THRESHOLD}
+    for option in options:
+        if option in args:
+            index = args.index(option)
+            options[option] = args[index + 1]
+            del args[index:index + 2]
+
+    results = run_benchmarks(args or None, repeat=int(options["--repeat"]))
+    print_results(results)
+
+    if save:
+        save_baseline(results)
+        return
+
+    baseline = load_baseline()
+    if baseline is None:
+        print(f"\n没有找到基线文件 {BASELINE_PATH}，用 --save 生成")
+        return
+    regressions = compare_with_baseline(results, baseline, float(options["--threshold"]))
+    if not regressions:
+        print("\n与基线相比没有性能回退")
+        return
+    print("\n性能回退:")
+    for name, ratio in regressions:
+        if ratio is None:
+            print(f"  {name}: 输出与参考后端不一致")
+        else:
+            print(f"  {name}: 比基线慢 {ratio:.2f} 倍")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import os
+import shutil
+import atexit
+import tempfile
+import threading
+import uuid
+from selenium import webdriver
+from selenium.webdriver.edge.options import Options
+from selenium.webdriver.edge.service import Service
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
+from webdriver_manager.microsoft import EdgeChromiumDriverManager
+from throttle import get_throttle
+
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36 Edg/134.0.0.0"
+
+# 每个浏览器实例最多访问多少个页面后重建，避免内存泄漏越积越多
+MAX_PAGES_PER_DRIVER = 50
+PAGE_LOAD_TIMEOUT = 60
+# 等待正文元素出现的最长时间
+WAIT_TIMEOUT = 20
+
+# 只需要页面的HTML，图片、样式表和字体都不加载
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.css", "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*only=styles*",  # MediaWiki通过load.php加载的样式
+]
+BLOCKED_CONTENT_SETTINGS = {
+    "profile.managed_default_content_settings.images": 2,
+    "profile.managed_default_content_settings.fonts": 2,
+}
+
+
+class PooledDriver:
+    """池中的单个浏览器实例，记录临时目录和已访问页面数"""
+
+    def __init__(self, driver, temp_dir):
+        self.driver = driver
+        self.temp_dir = temp_dir
+        self.pages = 0
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+        # 清理临时用户数据目录
+        if os.path.exists(self.temp_dir):
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+
+class BrowserPool:
+    """长期存活的Edge WebDriver池，多个页面复用同一个浏览器"""
+
+    def __init__(self, size=1, max_pages_per_driver=MAX_PAGES_PER_DRIVER, page_load_timeout=PAGE_LOAD_TIMEOUT):
+        self.size = size
+        self.max_pages_per_driver = max_pages_per_driver
+        self.page_load_timeout = page_load_timeout
+        self._idle = []
+        self._created = 0
+        self._all = set()
+        self._lock = threading.Lock()
+        # 有浏览器归还或被销毁（空出一个新建名额）时通知等待的线程
+        self._available = threading.Condition(self._lock)
+        self._driver_path = None
+        self._closed = False
+
+    def _get_driver_path(self):
+        # EdgeChromiumDriverManager().install() 只在第一次创建浏览器时执行
+        with self._lock:
+            if self._driver_path is None:
+                self._driver_path = EdgeChromiumDriverManager().install()
+            return self._driver_path
+
+    def _build_options(self, temp_dir):
+        edge_options = Options()
+        edge_options.add_argument("--headless")  # 无头模式，不显示浏览器窗口
+        edge_options.add_argument("--disable-gpu")
+        edge_options.add_argument("--window-size=1920,1080")
+        edge_options.add_argument("--no-sandbox")
+        edge_options.add_argument("--disable-dev-shm-usage")
+        edge_options.add_argument("--disable-extensions")  # 禁用扩展，减少错误
+        edge_options.add_argument("--disable-logging")  # 减少日志输出
+        edge_options.add_argument("--log-level=3")  # 仅显示致命错误
+        edge_options.add_argument(f"user-agent={USER_AGENT}")
+        edge_options.add_argument(f"--user-data-dir={temp_dir}")
+        edge_options.add_argument("--blink-settings=imagesEnabled=false")
+        edge_options.add_experimental_option("prefs", BLOCKED_CONTENT_SETTINGS)
+        # DOMContentLoaded后就返回，正文是否就绪由显式等待判断
+        edge_options.page_load_strategy = "eager"
+        return edge_options
+
+    def _block_resources(self, driver):
+        """通过CDP拦截图片、样式表和字体请求"""
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+        except Exception as e:
+            print(f"无法设置资源拦截: {e}")
+
+    def _create_driver(self):
+        # 每个浏览器实例使用独立的用户数据目录
+        temp_dir = os.path.join(tempfile.gettempdir(), f"edge_user_data_{uuid.uuid4().hex}")
+        try:
+            driver = webdriver.Edge(service=Service(self._get_driver_path()), options=self._build_options(temp_dir))
+            driver.set_page_load_timeout(self.page_load_timeout)
+            self._block_resources(driver)
+        except Exception:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+        pooled = PooledDriver(driver, temp_dir)
+        with self._lock:
+            self._all.add(pooled)
+        return pooled
+
+    def acquire(self):
+        """取出一个空闲浏览器，池未满时新建，否则等待归还或有浏览器被销毁"""
+        with self._available:
+            while True:
+                if self._closed:
+                    raise RuntimeError("浏览器池已关闭")
+                if self._idle:
+                    return self._idle.pop()
+                if self._created < self.size:
+                    self._created += 1
+                    break
+                self._available.wait()
+
+        try:
+            return self._create_driver()
+        except Exception:
+            with self._available:
+                self._created -= 1
+                self._available.notify()
+            raise
+
+    def release(self, pooled, broken=False):
+        """归还浏览器；出错或访问页面数达到上限时销毁，下次按需重建"""
+        if broken or self._closed or pooled.pages >= self.max_pages_per_driver:
+            self._discard(pooled)
+            return
+        with self._available:
+            self._idle.append(pooled)
+            self._available.notify()
+
+    def _discard(self, pooled):
+        pooled.quit()
+        with self._available:
+            self._all.discard(pooled)
+            self._created -= 1
+            # 空出了新建名额，唤醒一个等待的线程去重建浏览器
+            self._available.notify()
+
+    def _wait_for_content(self, driver, wait_selector, wait_timeout):
+        """等待正文元素出现；没有指定选择器时等待文档加载完成"""
+        try:
+            if wait_selector:
+                WebDriverWait(driver, wait_timeout).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, wait_selector))
+                )
+            else:
+                WebDriverWait(driver, wait_timeout).until(
+                    lambda d: d.execute_script("return document.readyState") == "complete"
+                )
+        except TimeoutException:
+            # 超时不代表浏览器出错，可能页面本身没有正文，交给解析步骤判断
+            print(f"等待 {wait_selector or '页面加载'} 超时（{wait_timeout} 秒）")
+
+    def fetch(self, url, max_retries=3, wait_selector=None, wait_timeout=WAIT_TIMEOUT):
+        """用池中的浏览器访问URL并返回页面源代码，失败返回None
+
+        wait_selector为正文元素的CSS选择器，出现后立即返回，不再固定等待。
+        每次尝试（包括重试）都经过站点的自适应限流器，失败后等多久由限流器决定；
+        站点熔断时抛出CircuitOpenError。
+        """
+        throttle = get_throttle(url)
+        for attempt in range(max_retries):
+            throttle.acquire()
+            pooled = None
+            page_source = None
+            try:
+                pooled = self.acquire()
+                pooled.driver.get(url)
+                pooled.pages += 1
+
+                self._wait_for_content(pooled.driver, wait_selector, wait_timeout)
+
+                page_source = pooled.driver.page_source
+                self.release(pooled)
+                return page_source
+            except Exception as e:
+                # 浏览器可能已崩溃，销毁后由下一次访问重建
+                if pooled is not None:
+                    self.release(pooled, broken=True)
+                print(f"尝试 {attempt+1}/{max_retries} 失败: {e}")
+            finally:
+                # 浏览器耗时包含渲染等待，不作为服务器变慢的依据
+                throttle.release(200 if page_source is not None else None, 0.0)
+
+        print(f"达到最大重试次数，无法获取页面 {url}")
+        return None
+
+    def close(self):
+        """关闭池中所有浏览器并清理临时目录"""
+        with self._available:
+            self._closed = True
+            drivers = list(self._all)
+            self._all.clear()
+            self._idle.clear()
+            self._created = 0
+            # 等待中的线程醒来后发现池已关闭，直接报错返回
+            self._available.notify_all()
+        for pooled in drivers:
+            pooled.quit()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool(size=1):
+    """获取进程内共享的浏览器池，进程退出时自动关闭"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._closed:
+            _pool = BrowserPool(size=size)
+            atexit.register(_pool.close)
+        return _pool
@@ -0,0 +1,151 @@
+import os
+import sys
+import time
+import glob
+import shutil
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from story_index import load_story_index, OUTPUT_DIR
+from corpus_reader import load_dialogues
+from speaker_map import normalize_chinese_speaker
+
+
+EXPORT_DIR = os.path.join(OUTPUT_DIR, "corpus_parquet")
+
+# 重复值很多的列用字典编码，文件中每个值只存一次
+DICTIONARY_COLUMNS = ["chapter", "english_chapter", "kind", "chinese_speaker", "english_speaker", "alignment"]
+
+SCHEMA = pa.schema([
+    ("chapter", pa.dictionary(pa.int32(), pa.string())),
+    ("english_chapter", pa.dictionary(pa.int32(), pa.string())),
+    ("kind", pa.dictionary(pa.int32(), pa.string())),
+    ("episode_id", pa.string()),
+    ("episode_title", pa.string()),
+    ("position", pa.int32()),
+    ("chinese_speaker", pa.dictionary(pa.int32(), pa.string())),
+    ("chinese_text", pa.string()),
+    ("english_speaker", pa.dictionary(pa.int32(), pa.string())),
+    ("english_text", pa.string()),
+    ("alignment", pa.dictionary(pa.int32(), pa.string())),
+    ("confidence", pa.float32()),
+])
+
+
+def iter_corpus_rows(index):
+    """按索引顺序产出语料的每一行
+
+    有对齐结果的小节导出中英文对照；只有中文的小节（如主线）英文列为空
+    """
+    for entry in index.values():
+        base = {
+            "chapter": entry["chinese_chapter"],
+            "english_chapter": entry["english_chapter"],
+            "kind": entry["kind"],
+            "episode_id": entry["id"],
+            "episode_title": entry["chinese_title"],
+        }
+        aligned_data = load_dialogues(entry["aligned_path"])
+        if aligned_data:
+            for position, item in enumerate(aligned_data):
+                yield dict(
+                    base,
+                    position=position,
+                    chinese_speaker=normalize_chinese_speaker(item["chinese_speaker"]) or None,
+                    chinese_text=item["chinese_text"],
+                    english_speaker=item["english_speaker"] or None,
+                    english_text=item["english_text"],
+                    alignment=item.get("alignment", "1:1"),
+                    confidence=item.get("confidence"),
+                )
+            continue
+        for position, item in enumerate(load_dialogues(entry["cn_path"]) or []):
+            yield dict(
+                base,
+                position=position,
+                chinese_speaker=normalize_chinese_speaker(item["speaker"]) or None,
+                chinese_text=item["dialogue"],
+                english_speaker=None,
+                english_text=None,
+                alignment=None,
+                confidence=None,
+            )
+
+
+def build_corpus_table(index):
+    columns = {field.name: [] for field in SCHEMA}
+    for row in iter_corpus_rows(index):
+        for name, values in columns.items():
+            values.append(row[name])
+    arrays = []
+    for field in SCHEMA:
+        if field.name in DICTIONARY_COLUMNS:
+            arrays.append(pa.array(columns[field.name], type=pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(columns[field.name], type=field.type))
+    return pa.Table.from_arrays(arrays, schema=SCHEMA)
+
+
+def export_corpus(export_dir=EXPORT_DIR):
+    """把语料导出为按章节分区的Parquet数据集，先写到临时目录，完成后替换旧的导出"""
+    table = build_corpus_table(load_story_index())
+    tmp_dir = f"{export_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    ds.write_dataset(
+        table,
+        tmp_dir,
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([("chapter", pa.string())]), flavor="hive"),
+        file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    shutil.rmtree(export_dir, ignore_errors=True)
+    os.replace(tmp_dir, export_dir)
+    return table.num_rows
+
+
+def load_corpus(export_dir=EXPORT_DIR, chapters=None, columns=None):
+    """以内存映射方式读取导出的语料，返回pyarrow.Table（需要时再 .to_pandas()）
+
+    chapters指定章节时只读取对应的分区目录
+    """
+    filters = [("chapter", "in", list(chapters))] if chapters else None
+    return pq.read_table(
+        export_dir,
+        columns=columns,
+        filters=filters,
+        memory_map=True,
+        partitioning=ds.HivePartitioning.discover(infer_dictionary=True),
+    )
+
+
+def directory_size(pattern):
+    return sum(os.path.getsize(path) for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+
+
+def main():
+    # 用法: python corpus_export.py            导出到output/corpus_parquet
+    #       python corpus_export.py load [章节] 读取导出结果并打印统计
+    args = sys.argv[1:]
+    if args and args[0] == "load":
+        start = time.perf_counter()
+        table = load_corpus(chapters=args[1:] or None)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"读取 {table.num_rows} 行，用时 {elapsed:.1f} 毫秒")
+        print(table.schema)
+        return
+
+    start = time.perf_counter()
+    rows = export_corpus()
+    elapsed = time.perf_counter() - start
+    parquet_size = directory_size(os.path.join(EXPORT_DIR, "**", "*.parquet"))
+    json_size = sum(
+        directory_size(os.path.join(OUTPUT_DIR, folder, "**", "*.json"))
+        for folder in ("dialogues", "side_dialogues", "en_side_dialogues")
+    )
+    print(f"导出 {rows} 行到 {EXPORT_DIR}，用时 {elapsed:.1f} 秒")
+    print(f"Parquet {parquet_size / 1e6:.2f} MB，对应的JSON文件 {json_size / 1e6:.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+import sys
+import math
+import time
+import tracemalloc
+from array import array
+from bisect import bisect_right
+from corpus_reader import iter_episodes
+from speaker_map import normalize_chinese_speaker
+
+
+# 每个语料目录中小节文件的格式：chinese为 {speaker, dialogue}，english为 {english_speaker, english_dialogue}，
+# aligned为merge.py的对齐结果
+COLLECTION_SHAPES = {"cn_main": "chinese", "cn_side": "chinese", "aligned": "aligned"}
+
+LANG_CN = "cn"
+LANG_EN = "en"
+
+NO_ID = -1
+
+
+class InternTable:
+    """字符串与整数编号的对照，同一个字符串只保存一次"""
+
+    __slots__ = ("names", "ids")
+
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+
+    def intern(self, name):
+        if name is None:
+            return NO_ID
+        index = self.ids.get(name)
+        if index is None:
+            index = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return index
+
+    def name(self, index):
+        return None if index == NO_ID else self.names[index]
+
+    def __len__(self):
+        return len(self.names)
+
+
+class TextBuffer:
+    """大量短文本拼接成一个连续的字符串，第i段为 buffer[offsets[i]:offsets[i + 1]]
+
+    追加时先攒在列表里，第一次读取时才拼接，避免反复复制整个缓冲区。
+    """
+
+    __slots__ = ("buffer", "offsets", "pending")
+
+    def __init__(self):
+        self.buffer = ""
+        self.offsets = array("I", [0])
+        self.pending = []
+
+    def append(self, text):
+        self.pending.append(text)
+        self.offsets.append(self.offsets[-1] + len(text))
+        return len(self.offsets) - 2
+
+    def freeze(self):
+        if self.pending:
+            self.buffer += "".join(self.pending)
+            self.pending = []
+
+    def __getitem__(self, index):
+        self.freeze()
+        return self.buffer[self.offsets[index]:self.offsets[index + 1]]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def find_all(self, query):
+        """返回包含query的文本段下标（跨段的匹配不算）"""
+        self.freeze()
+        matches = []
+        start = self.buffer.find(query)
+        while start != -1:
+            index = bisect_right(self.offsets, start) - 1
+            if start + len(query) <= self.offsets[index + 1] and (not matches or matches[-1] != index):
+                matches.append(index)
+            start = self.buffer.find(query, start + 1)
+        return matches
+
+
+class CompactCorpus:
+    """整个语料的紧凑表示：每行只占几个整数，说话人、章节等重复的字符串编号后只存一次
+
+    行的字段按列存放在并行数组中，中英文台词各自拼接成一个连续字符串；
+    小节按行号区间 [episode_starts[i], episode_starts[i + 1]) 划分。
+    """
+
+    def __init__(self):
+        self.speakers = InternTable()
+        self.labels = InternTable()
+        # 小节
+        self.episode_collections = array("i")
+        self.episode_chapters = array("i")
+        self.episode_shapes = array("i")
+        self.episode_titles = TextBuffer()
+        self.episode_starts = array("I", [0])
+        # 行
+        self.cn_speakers = array("i")
+        self.cn_texts = TextBuffer()
+        self.en_speakers = array("i")
+        self.en_texts = TextBuffer()
+        self.alignments = array("i")
+        self.confidences = array("d")
+
+    @property
+    def line_count(self):
+        return len(self.cn_speakers)
+
+    @property
+    def episode_count(self):
+        return len(self.episode_collections)
+
+    def add_line(self, cn_speaker, cn_text, en_speaker, en_text, alignment=None, confidence=None):
+        self.cn_speakers.append(self.speakers.intern(cn_speaker))
+        self.cn_texts.append(cn_text or "")
+        self.en_speakers.append(self.speakers.intern(en_speaker))
+        self.en_texts.append(en_text or "")
+        self.alignments.append(self.labels.intern(alignment))
+        self.confidences.append(math.nan if confidence is None else confidence)
+
+    def add_episode(self, collection, chapter, title, records, shape=None):
+        """追加一个小节，records是小节文件中的对话列表"""
+        shape = shape or COLLECTION_SHAPES[collection]
+        for item in records:
+            if shape == "chinese":
+                self.add_line(item["speaker"], item["dialogue"], None, None)
+            elif shape == "english":
+                self.add_line(None, None, item["english_speaker"], item["english_dialogue"])
+            else:
+                self.add_line(
+                    item["chinese_speaker"], item["chinese_text"], item["english_speaker"], item["english_text"],
+                    item.get("alignment"), item.get("confidence"),
+                )
+        self.episode_collections.append(self.labels.intern(collection))
+        self.episode_chapters.append(self.labels.intern(chapter))
+        self.episode_shapes.append(self.labels.intern(shape))
+        self.episode_titles.append(title)
+        self.episode_starts.append(self.line_count)
+        return self.episode_count - 1
+
+    def episode_info(self, episode):
+        return {
+            "collection": self.labels.name(self.episode_collections[episode]),
+            "chapter": self.labels.name(self.episode_chapters[episode]),
+            "title": self.episode_titles[episode],
+            "lines": self.episode_starts[episode + 1] - self.episode_starts[episode],
+        }
+
+    def line_record(self, line, shape):
+        """还原成小节文件中的字典格式"""
+        if shape == "chinese":
+            return {"speaker": self.speakers.name(self.cn_speakers[line]), "dialogue": self.cn_texts[line]}
+        if shape == "english":
+            return {"english_speaker": self.speakers.name(self.en_speakers[line]), "english_dialogue": self.en_texts[line]}
+        record = {
+            "chinese_speaker": self.speakers.name(self.cn_speakers[line]),
+            "chinese_text": self.cn_texts[line],
+            "english_speaker": self.speakers.name(self.en_speakers[line]),
+            "english_text": self.en_texts[line],
+        }
+        if self.alignments[line] != NO_ID:
+            record["alignment"] = self.labels.name(self.alignments[line])
+        if not math.isnan(self.confidences[line]):
+            record["confidence"] = self.confidences[line]
+        return record
+
+    def episode_records(self, episode):
+        """按原来的字典格式返回一个小节的对话列表，可以直接交给对齐等函数"""
+        shape = self.labels.name(self.episode_shapes[episode])
+        start, end = self.episode_starts[episode], self.episode_starts[episode + 1]
+        return [self.line_record(line, shape) for line in range(start, end)]
+
+    def line_episode(self, line):
+        return bisect_right(self.episode_starts, line) - 1
+
+    def search(self, query, language=LANG_CN):
+        """在连续的台词缓冲区中查找子串，返回匹配的行号"""
+        texts = self.cn_texts if language == LANG_CN else self.en_texts
+        return texts.find_all(query)
+
+    def lines_by_speaker(self, speaker, language=LANG_CN):
+        speaker_id = self.speakers.ids.get(speaker)
+        if speaker_id is None:
+            return []
+        speakers = self.cn_speakers if language == LANG_CN else self.en_speakers
+        return [line for line, value in enumerate(speakers) if value == speaker_id]
+
+
+def load_compact_corpus(collections=None, chapter=None):
+    """逐个小节读取语料并转成CompactCorpus，读完的小节字典随即释放"""
+    corpus = CompactCorpus()
+    for episode in iter_episodes(collections, chapter):
+        corpus.add_episode(episode.collection, episode.chapter, episode.title, episode.load(use_cache=False))
+    corpus.cn_texts.freeze()
+    corpus.en_texts.freeze()
+    corpus.episode_titles.freeze()
+    return corpus
+
+
+def measure(load):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = load()
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, elapsed
+
+
+def main():
+    # 用法: python corpus_model.py                 对比字典列表和紧凑表示的内存占用
+    #       python corpus_model.py search 维尔汀    在紧凑语料中查找台词（--en 查英文）
+    args = sys.argv[1:]
+    if args and args[0] == "search":
+        language = LANG_EN if "--en" in args else LANG_CN
+        query = next(arg for arg in args[1:] if arg != "--en")
+        corpus = load_compact_corpus()
+        lines = corpus.search(query, language)
+        print(f"共 {len(lines)} 行包含 {query}")
+        for line in lines[:20]:
+            info = corpus.episode_info(corpus.line_episode(line))
+            speakers, texts = (corpus.cn_speakers, corpus.cn_texts) if language == LANG_CN else (corpus.en_speakers, corpus.en_texts)
+            speaker = normalize_chinese_speaker(corpus.speakers.name(speakers[line]) or "")
+            print(f"  [{info['chapter']} / {info['title']}] {speaker}: {texts[line]}")
+        return
+
+    dialogues, dict_bytes, dict_seconds = measure(
+        lambda: [episode.load(use_cache=False) for episode in iter_episodes()]
+    )
+    del dialogues
+    corpus, compact_bytes, compact_seconds = measure(load_compact_corpus)
+    print(f"{corpus.episode_count} 个小节，{corpus.line_count} 行，{len(corpus.speakers)} 个说话人")
+    print(f"字典列表: {dict_bytes / 1e6:.1f} MB（{dict_seconds:.2f} 秒）")
+    print(f"紧凑表示: {compact_bytes / 1e6:.1f} MB（{compact_seconds:.2f} 秒），为前者的 {compact_bytes / dict_bytes:.0%}")
+
+
+if __name__ == "__main__":
+    main()
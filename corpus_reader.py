@@ -0,0 +1,168 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+from episode_io import EPISODE_FORMATS, resolve_episode_path, iter_episode_records, episode_stem
+
+
+OUTPUT_DIR = "output"
+
+# 可以遍历的语料目录，每个目录下是 <章节>/<小节>.json（或.jsonl/.jsonl.gz/.jsonl.zst）
+CORPUS_DIRS = {
+    "cn_main": os.path.join(OUTPUT_DIR, "dialogues"),
+    "cn_side": os.path.join(OUTPUT_DIR, "side_dialogues"),
+    "aligned": os.path.join(OUTPUT_DIR, "en_side_dialogues"),
+}
+
+# LRU中最多保留的小节数
+DEFAULT_CACHE_SIZE = 64
+
+
+class EpisodeCache:
+    """按文件路径缓存最近读取的小节，文件被修改后自动失效"""
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, path, mtime):
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is None or entry[0] != mtime:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(path)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, path, mtime, dialogues):
+        with self.lock:
+            self.entries[path] = (mtime, dialogues)
+            self.entries.move_to_end(path)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+
+_cache = EpisodeCache()
+
+
+def get_episode_cache():
+    return _cache
+
+
+def load_episode(path, use_cache=True):
+    """读取一个小节的对话列表，文件不存在时返回None
+
+    path可以是 <小节>.json 键，实际文件为JSONL或压缩格式时同样能读取。
+    use_cache为True时结果进入LRU缓存，返回的列表是共享的，调用方不要修改。
+    全量遍历时传False，避免把常用的小节挤出缓存。
+    """
+    path = resolve_episode_path(path)
+    if path is None:
+        return None
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    if use_cache:
+        dialogues = _cache.get(path, mtime)
+        if dialogues is not None:
+            return dialogues
+    dialogues = list(iter_episode_records(path))
+    if use_cache:
+        _cache.put(path, mtime, dialogues)
+    return dialogues
+
+
+def load_dialogues(path):
+    """全量导入、导出时逐个读取小节，不占用小节缓存；path为空（没有对应的小节）时返回None"""
+    return load_episode(path, use_cache=False) if path else None
+
+
+class EpisodeRef:
+    """语料中的一个小节，只记录位置，遍历台词时才读取文件"""
+
+    __slots__ = ("collection", "chapter", "title", "path")
+
+    def __init__(self, collection, chapter, title, path):
+        self.collection = collection
+        self.chapter = chapter
+        self.title = title
+        self.path = path
+
+    def load(self, use_cache=True):
+        return load_episode(self.path, use_cache) or []
+
+    def lines(self, use_cache=False):
+        for position, line in enumerate(self.load(use_cache)):
+            yield position, line
+
+    def __repr__(self):
+        return f"EpisodeRef({self.collection!r}, {self.chapter!r}, {self.title!r})"
+
+
+def _sorted_entries(directory, want_dirs):
+    suffixes = tuple(EPISODE_FORMATS.values())
+    try:
+        with os.scandir(directory) as entries:
+            names = [
+                entry.name for entry in entries
+                if (entry.is_dir() if want_dirs else entry.is_file() and entry.name.endswith(suffixes))
+            ]
+    except OSError:
+        return []
+    return sorted(names)
+
+
+def iter_chapters(collections=None):
+    """遍历章节，产出 (语料名, 章节名)"""
+    for collection in collections or CORPUS_DIRS:
+        for chapter in _sorted_entries(CORPUS_DIRS[collection], want_dirs=True):
+            yield collection, chapter
+
+
+def iter_episodes(collections=None, chapter=None):
+    """遍历小节，产出EpisodeRef，不读取文件内容"""
+    for collection, chapter_name in iter_chapters(collections):
+        if chapter and chapter_name != chapter:
+            continue
+        chapter_dir = os.path.join(CORPUS_DIRS[collection], chapter_name)
+        for filename in _sorted_entries(chapter_dir, want_dirs=False):
+            yield EpisodeRef(collection, chapter_name, episode_stem(filename), os.path.join(chapter_dir, filename))
+
+
+def iter_lines(collections=None, chapter=None, use_cache=False):
+    """逐行遍历语料，每次只解码一个小节的文件，内存占用与语料总量无关
+
+    产出 (EpisodeRef, 行号, 该行的字典)
+    """
+    for episode in iter_episodes(collections, chapter):
+        for position, line in episode.lines(use_cache):
+            yield episode, position, line
+
+
+def get_episode(collection, chapter, title):
+    """按章节和标题读取一个小节（经过LRU缓存）"""
+    return load_episode(os.path.join(CORPUS_DIRS[collection], chapter, f"{title}.json"))
+
+
+def main():
+    # 用法: python corpus_reader.py [cn_main|cn_side|aligned ...]，统计各语料的章节、小节和行数
+    collections = sys.argv[1:] or list(CORPUS_DIRS)
+    for collection in collections:
+        chapters = sum(1 for _ in iter_chapters([collection]))
+        episodes = sum(1 for _ in iter_episodes([collection]))
+        lines = sum(1 for _ in iter_lines([collection]))
+        print(f"{collection}: {chapters} 个章节，{episodes} 个小节，{lines} 行")
+
+
+if __name__ == "__main__":
+    main()
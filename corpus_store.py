@@ -0,0 +1,326 @@
+import os
+import sys
+import time
+import sqlite3
+from story_index import load_story_index, OUTPUT_DIR
+from corpus_reader import load_dialogues
+from speaker_map import load_speaker_map, normalize_chinese_speaker
+
+
+CORPUS_DB_PATH = os.path.join(OUTPUT_DIR, "corpus.sqlite3")
+
+LANG_CN = "cn"
+LANG_EN = "en"
+
+SCHEMA = """
+CREATE TABLE chapters (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    chinese_title TEXT NOT NULL,
+    english_title TEXT,
+    UNIQUE (kind, chinese_title)
+);
+CREATE TABLE episodes (
+    id INTEGER PRIMARY KEY,
+    episode_key TEXT NOT NULL UNIQUE,
+    chapter_id INTEGER NOT NULL REFERENCES chapters (id),
+    position INTEGER NOT NULL,
+    chinese_title TEXT NOT NULL,
+    english_title TEXT,
+    cn_url TEXT,
+    en_url TEXT
+);
+CREATE TABLE speakers (
+    id INTEGER PRIMARY KEY,
+    language TEXT NOT NULL,
+    name TEXT NOT NULL,
+    mapped_name TEXT,
+    UNIQUE (language, name)
+);
+CREATE TABLE lines (
+    id INTEGER PRIMARY KEY,
+    episode_id INTEGER NOT NULL REFERENCES episodes (id),
+    language TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    speaker_id INTEGER REFERENCES speakers (id),
+    text TEXT NOT NULL
+);
+CREATE INDEX lines_episode ON lines (episode_id, language, position);
+CREATE INDEX lines_speaker ON lines (speaker_id);
+CREATE TABLE aligned_pairs (
+    id INTEGER PRIMARY KEY,
+    episode_id INTEGER NOT NULL REFERENCES episodes (id),
+    position INTEGER NOT NULL,
+    cn_speaker_id INTEGER REFERENCES speakers (id),
+    cn_text TEXT NOT NULL,
+    en_speaker_id INTEGER REFERENCES speakers (id),
+    en_text TEXT NOT NULL,
+    alignment TEXT,
+    confidence REAL
+);
+CREATE INDEX aligned_pairs_episode ON aligned_pairs (episode_id, position);
+-- 英文按词建索引（porter词干），内容直接取自lines表，只索引英文行
+CREATE VIRTUAL TABLE lines_en_fts USING fts5(
+    text, content='lines', content_rowid='id', tokenize='porter unicode61'
+);
+-- 中文没有空格分词，入库时把每行拆成单字和相邻双字两列，用空格隔开后建索引
+CREATE VIRTUAL TABLE lines_cn_fts USING fts5(unigrams, bigrams, content='');
+"""
+
+
+def cjk_runs(text):
+    """按标点和空白切分，返回连续的文字片段"""
+    runs = []
+    current = []
+    for char in text:
+        if char.isalnum():
+            current.append(char)
+        elif current:
+            runs.append("".join(current))
+            current = []
+    if current:
+        runs.append("".join(current))
+    return runs
+
+
+def cjk_unigrams(text):
+    return " ".join(char for run in cjk_runs(text) for char in run)
+
+
+def cjk_bigrams(text):
+    return " ".join(run[i:i + 2] for run in cjk_runs(text) for i in range(len(run) - 1))
+
+
+def cjk_match_query(query):
+    """把中文检索词转换成FTS5查询：一个字查单字列，多个字按相邻双字做短语查询"""
+    terms = []
+    for run in cjk_runs(query):
+        if len(run) == 1:
+            terms.append(f'unigrams : "{run}"')
+        else:
+            bigrams = " ".join(run[i:i + 2] for i in range(len(run) - 1))
+            terms.append(f'bigrams : "{bigrams}"')
+    return " AND ".join(terms)
+
+
+def en_match_query(query):
+    """把英文检索词转换成FTS5查询：每个词加引号（内部的引号写两遍），避免撇号等字符被当作FTS5语法"""
+    terms = ['"{}"'.format(term.replace('"', '""')) for term in query.split()]
+    return " AND ".join(terms)
+
+
+class CorpusBuilder:
+    """把结构索引和对话文件导入一个新的SQLite数据库"""
+
+    def __init__(self, conn, speaker_map):
+        self.conn = conn
+        self.speaker_map = speaker_map
+        self.chapter_ids = {}
+        self.speaker_ids = {}
+        self.stats = {"chapters": 0, "episodes": 0, "lines": 0, "aligned_pairs": 0}
+
+    def chapter_id(self, kind, chinese_title, english_title):
+        key = (kind, chinese_title)
+        if key not in self.chapter_ids:
+            cursor = self.conn.execute(
+                "INSERT INTO chapters (kind, chinese_title, english_title) VALUES (?, ?, ?)",
+                (kind, chinese_title, english_title),
+            )
+            self.chapter_ids[key] = cursor.lastrowid
+            self.stats["chapters"] += 1
+        return self.chapter_ids[key]
+
+    def speaker_id(self, language, name):
+        if language == LANG_CN:
+            name = normalize_chinese_speaker(name)
+        else:
+            name = name.strip()
+        if not name:
+            return None
+        key = (language, name)
+        if key not in self.speaker_ids:
+            mapped_name = self.speaker_map.get(name) if language == LANG_CN else None
+            cursor = self.conn.execute(
+                "INSERT INTO speakers (language, name, mapped_name) VALUES (?, ?, ?)",
+                (language, name, mapped_name),
+            )
+            self.speaker_ids[key] = cursor.lastrowid
+        return self.speaker_ids[key]
+
+    def add_lines(self, episode_id, language, dialogues, speaker_key, text_key):
+        rows = [
+            (episode_id, language, position, self.speaker_id(language, item[speaker_key]), item[text_key])
+            for position, item in enumerate(dialogues)
+        ]
+        self.conn.executemany(
+            "INSERT INTO lines (episode_id, language, position, speaker_id, text) VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+        self.stats["lines"] += len(rows)
+
+    def add_aligned_pairs(self, episode_id, aligned_data):
+        rows = [
+            (
+                episode_id,
+                position,
+                self.speaker_id(LANG_CN, item["chinese_speaker"]),
+                item["chinese_text"],
+                self.speaker_id(LANG_EN, item["english_speaker"]),
+                item["english_text"],
+                item.get("alignment"),
+                item.get("confidence"),
+            )
+            for position, item in enumerate(aligned_data)
+        ]
+        self.conn.executemany(
+            "INSERT INTO aligned_pairs (episode_id, position, cn_speaker_id, cn_text, en_speaker_id, en_text, "
+            "alignment, confidence) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        self.stats["aligned_pairs"] += len(rows)
+
+    def add_episode(self, position, entry):
+        chinese_dialogues = load_dialogues(entry["cn_path"])
+        english_dialogues = load_dialogues(entry["en_path"])
+        if not chinese_dialogues and not english_dialogues:
+            return
+        chapter_id = self.chapter_id(entry["kind"], entry["chinese_chapter"], entry["english_chapter"])
+        cursor = self.conn.execute(
+            "INSERT INTO episodes (episode_key, chapter_id, position, chinese_title, english_title, cn_url, en_url) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (entry["id"], chapter_id, position, entry["chinese_title"], entry["english_title"],
+             entry["cn_url"], entry["en_url"]),
+        )
+        episode_id = cursor.lastrowid
+        self.stats["episodes"] += 1
+        if chinese_dialogues:
+            self.add_lines(episode_id, LANG_CN, chinese_dialogues, "speaker", "dialogue")
+        if english_dialogues:
+            self.add_lines(episode_id, LANG_EN, english_dialogues, "english_speaker", "english_dialogue")
+        aligned_data = load_dialogues(entry["aligned_path"])
+        if aligned_data:
+            self.add_aligned_pairs(episode_id, aligned_data)
+
+    def build_search_index(self):
+        # 'rebuild'会把lines表中的中文行也建进英文索引，这里只插入英文行
+        self.conn.execute(
+            "INSERT INTO lines_en_fts (rowid, text) SELECT id, text FROM lines WHERE language = ?", (LANG_EN,)
+        )
+        rows = self.conn.execute("SELECT id, text FROM lines WHERE language = ?", (LANG_CN,))
+        self.conn.executemany(
+            "INSERT INTO lines_cn_fts (rowid, unigrams, bigrams) VALUES (?, ?, ?)",
+            ((line_id, cjk_unigrams(text), cjk_bigrams(text)) for line_id, text in rows.fetchall()),
+        )
+
+
+def build_corpus_store(path=CORPUS_DB_PATH):
+    """根据story_index.json把所有小节导入SQLite，先写临时文件，完成后替换旧数据库"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(SCHEMA)
+        builder = CorpusBuilder(conn, load_speaker_map())
+        with conn:
+            for position, entry in enumerate(load_story_index().values()):
+                builder.add_episode(position, entry)
+            builder.build_search_index()
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+    return builder.stats
+
+
+class CorpusStore:
+    """只读查询语料库"""
+
+    LINE_COLUMNS = """
+        SELECT l.id, e.episode_key, c.chinese_title AS chapter, e.chinese_title AS episode,
+               l.language, l.position, s.name AS speaker, l.text
+        FROM lines l
+        JOIN episodes e ON e.id = l.episode_id
+        JOIN chapters c ON c.id = e.chapter_id
+        LEFT JOIN speakers s ON s.id = l.speaker_id
+    """
+
+    def __init__(self, path=CORPUS_DB_PATH):
+        self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        self.conn.row_factory = sqlite3.Row
+
+    def search(self, query, language=LANG_CN, limit=50):
+        """全文检索对话，中文按字面连续匹配，英文按词（含词干）匹配"""
+        if language == LANG_CN:
+            match = cjk_match_query(query)
+            table = "lines_cn_fts"
+        else:
+            match = en_match_query(query)
+            table = "lines_en_fts"
+        if not match:
+            return []
+        sql = f"{self.LINE_COLUMNS} WHERE l.id IN (SELECT rowid FROM {table} WHERE {table} MATCH ?) AND l.language = ?"
+        rows = self.conn.execute(sql + " ORDER BY l.id LIMIT ?", (match, language, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def lines_by_speaker(self, name, language=LANG_CN, limit=None):
+        """某个说话人的所有台词，中文说话人不需要带冒号"""
+        if language == LANG_CN:
+            name = normalize_chinese_speaker(name)
+        sql = f"{self.LINE_COLUMNS} WHERE s.language = ? AND s.name = ? ORDER BY l.id"
+        params = [language, name]
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [dict(row) for row in self.conn.execute(sql, params).fetchall()]
+
+    def episode_lines(self, episode_key, language=LANG_CN):
+        sql = f"{self.LINE_COLUMNS} WHERE e.episode_key = ? AND l.language = ? ORDER BY l.position"
+        return [dict(row) for row in self.conn.execute(sql, (episode_key, language)).fetchall()]
+
+    def close(self):
+        self.conn.close()
+
+
+def main():
+    # 用法: python corpus_store.py build
+    #       python corpus_store.py search 维尔汀 [--en] [--limit N]
+    #       python corpus_store.py speaker 维尔汀 [--en] [--limit N]
+    args = sys.argv[1:]
+    command = args.pop(0) if args else "build"
+    if command == "build":
+        start = time.perf_counter()
+        stats = build_corpus_store()
+        print(f"章节 {stats['chapters']} 个，小节 {stats['episodes']} 个，对话 {stats['lines']} 行，"
+              f"对齐 {stats['aligned_pairs']} 对，用时 {time.perf_counter() - start:.1f} 秒")
+        print(f"语料库已保存到 {CORPUS_DB_PATH}")
+        return
+
+    language = LANG_CN
+    if "--en" in args:
+        args.remove("--en")
+        language = LANG_EN
+    limit = 50
+    if "--limit" in args:
+        index = args.index("--limit")
+        limit = int(args[index + 1])
+        del args[index:index + 2]
+    query = " ".join(args)
+
+    store = CorpusStore()
+    start = time.perf_counter()
+    if command == "speaker":
+        rows = store.lines_by_speaker(query, language, limit)
+    else:
+        rows = store.search(query, language, limit)
+    elapsed = (time.perf_counter() - start) * 1000
+    for row in rows:
+        print(f"{row['episode_key']} {row['episode']} #{row['position']} {row['speaker'] or ''}: {row['text']}")
+    print(f"共 {len(rows)} 条，用时 {elapsed:.1f} 毫秒")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
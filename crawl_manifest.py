@@ -0,0 +1,214 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from episode_io import resolve_episode_path, read_episode_file, remove_temp_files
+
+
+OUTPUT_DIR = "output"
+MANIFEST_PATH = os.path.join(OUTPUT_DIR, "crawl_manifest.sqlite3")
+
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+# 开始抓取前先记下，写入完成后改为done；进程被杀后留在清单中的就是中断的小节
+STATUS_IN_PROGRESS = "in_progress"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS episodes (
+    path TEXT PRIMARY KEY,
+    source TEXT,
+    chapter TEXT,
+    episode TEXT,
+    url TEXT,
+    status TEXT NOT NULL,
+    line_count INTEGER NOT NULL DEFAULT 0,
+    content_hash TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS episodes_status ON episodes (status);
+"""
+
+
+def now():
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+def normalize_path(path):
+    """统一成相对路径和/分隔符，作为小节的唯一键"""
+    return os.path.relpath(path).replace(os.sep, "/")
+
+
+def dialogues_hash(dialogues):
+    data = json.dumps(dialogues, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class CrawlManifest:
+    """记录每个小节抓取状态的SQLite清单，续爬时按输出路径O(1)查询"""
+
+    def __init__(self, path=MANIFEST_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def get(self, episode_path):
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM episodes WHERE path = ?", (normalize_path(episode_path),)).fetchone()
+        return dict(row) if row else None
+
+    def status(self, episode_path):
+        """返回 done / failed / in_progress，清单中没有记录时返回None"""
+        entry = self.get(episode_path)
+        return entry["status"] if entry else None
+
+    def _upsert(self, episode_path, **fields):
+        # 调用方没有提供的数据源和URL不覆盖已有记录
+        for column in ("source", "url"):
+            if fields.get(column) is None:
+                fields.pop(column, None)
+        key = normalize_path(episode_path)
+        timestamp = now()
+        with self.lock, self.conn:
+            existing = self.conn.execute("SELECT attempts, status FROM episodes WHERE path = ?", (key,)).fetchone()
+            if existing is None:
+                fields.setdefault("attempts", 1)
+                columns = ["path", "created_at", "updated_at"] + list(fields)
+                values = [key, timestamp, timestamp] + list(fields.values())
+                placeholders = ", ".join("?" for _ in columns)
+                self.conn.execute(f"INSERT INTO episodes ({', '.join(columns)}) VALUES ({placeholders})", values)
+            else:
+                # mark_started时已经计过一次尝试，完成或失败时不再重复计数
+                counted = existing["status"] == STATUS_IN_PROGRESS and fields.get("status") != STATUS_IN_PROGRESS
+                fields.setdefault("attempts", existing["attempts"] + (0 if counted else 1))
+                assignments = ", ".join(f"{column} = ?" for column in fields)
+                self.conn.execute(
+                    f"UPDATE episodes SET {assignments}, updated_at = ? WHERE path = ?",
+                    list(fields.values()) + [timestamp, key],
+                )
+
+    def mark_started(self, episode_path, url=None, source=None, chapter=None, episode=None):
+        """抓取前记录小节进入处理中（预写日志），写入完成前进程被杀时下次运行可以找到它"""
+        self._upsert(
+            episode_path,
+            source=source,
+            chapter=chapter or os.path.basename(os.path.dirname(episode_path)),
+            episode=episode or os.path.splitext(os.path.basename(episode_path))[0],
+            url=url,
+            status=STATUS_IN_PROGRESS,
+        )
+
+    def interrupted(self):
+        """上次运行中断时正在处理的小节路径，同时清理它们残留的临时文件"""
+        paths = [entry["path"] for entry in self.iter_episodes(status=STATUS_IN_PROGRESS)]
+        for path in paths:
+            remove_temp_files(path)
+        return paths
+
+    def mark_done(self, episode_path, dialogues, url=None, source=None, chapter=None, episode=None):
+        """记录抓取成功的小节及其行数、内容哈希"""
+        self._upsert(
+            episode_path,
+            source=source,
+            chapter=chapter or os.path.basename(os.path.dirname(episode_path)),
+            episode=episode or os.path.splitext(os.path.basename(episode_path))[0],
+            url=url,
+            status=STATUS_DONE,
+            line_count=len(dialogues),
+            content_hash=dialogues_hash(dialogues),
+            error=None,
+        )
+
+    def mark_failed(self, episode_path, error, url=None, source=None, chapter=None, episode=None):
+        """记录抓取失败的小节，之后可以单独重试"""
+        self._upsert(
+            episode_path,
+            source=source,
+            chapter=chapter or os.path.basename(os.path.dirname(episode_path)),
+            episode=episode or os.path.splitext(os.path.basename(episode_path))[0],
+            url=url,
+            status=STATUS_FAILED,
+            error=str(error),
+        )
+
+    def iter_episodes(self, status=None, source=None):
+        query = "SELECT * FROM episodes WHERE 1 = 1"
+        params = []
+        if status:
+            query += " AND status = ?"
+            params.append(status)
+        if source:
+            query += " AND source = ?"
+            params.append(source)
+        with self.lock:
+            rows = self.conn.execute(query + " ORDER BY path", params).fetchall()
+        for row in rows:
+            yield dict(row)
+
+    def is_crawled(self, episode_path):
+        """检查小节是否已经爬取过
+
+        清单中有记录时直接返回；没有记录的旧文件按原来的方式读取一次，
+        有效时补录进清单，之后的检查不再读取文件。
+        """
+        status = self.status(episode_path)
+        if status is not None:
+            return status == STATUS_DONE and resolve_episode_path(episode_path) is not None
+
+        try:
+            data = read_episode_file(episode_path)
+        except (OSError, ValueError, EOFError):
+            return False
+        if not data:
+            return False
+        self.mark_done(episode_path, data)
+        return True
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def get_manifest():
+    global _manifest
+    with _manifest_lock:
+        if _manifest is None:
+            _manifest = CrawlManifest()
+        return _manifest
+
+
+def main():
+    # 用法: python crawl_manifest.py [failed|summary]
+    command = sys.argv[1] if len(sys.argv) > 1 else "summary"
+    manifest = get_manifest()
+    if command == "failed":
+        for entry in manifest.iter_episodes(status=STATUS_FAILED):
+            print(f"{entry['path']}\t{entry['url']}\t尝试 {entry['attempts']} 次\t{entry['error']}")
+        return
+
+    counts = {}
+    lines = 0
+    for entry in manifest.iter_episodes():
+        counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+        lines += entry["line_count"]
+    print(f"已完成小节数: {counts.get(STATUS_DONE, 0)}")
+    print(f"失败小节数: {counts.get(STATUS_FAILED, 0)}")
+    print(f"中断的小节数: {counts.get(STATUS_IN_PROGRESS, 0)}")
+    print(f"对话总行数: {lines}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import io
+import os
+import gzip
+from contextlib import contextmanager
+import json_backend
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# 小节文件的保存格式 → 后缀
+# 抓取清单、story_index等处一律用 <小节>.json 作为小节的键，实际文件可以是其中任意一种
+EPISODE_FORMATS = {
+    "json": ".json",
+    "jsonl": ".jsonl",
+    "gzip": ".jsonl.gz",
+    "zstd": ".jsonl.zst",
+}
+DEFAULT_FORMAT = "json"
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 10
+
+
+def available_formats():
+    """当前环境可以写入的格式，没有安装zstandard时不包含zstd"""
+    return [fmt for fmt in EPISODE_FORMATS if fmt != "zstd" or zstandard is not None]
+
+
+def path_format(path):
+    """根据后缀判断文件格式，后缀不认识时当作json"""
+    for fmt, suffix in sorted(EPISODE_FORMATS.items(), key=lambda item: -len(item[1])):
+        if path.endswith(suffix):
+            return fmt
+    return DEFAULT_FORMAT
+
+
+def episode_stem(path):
+    """去掉格式后缀，如 "NS-01.jsonl.gz" → "NS-01" """
+    suffix = EPISODE_FORMATS[path_format(path)]
+    return path[:-len(suffix)] if path.endswith(suffix) else path
+
+
+def format_path(path, fmt):
+    return episode_stem(path) + EPISODE_FORMATS[fmt]
+
+
+def resolve_episode_path(path):
+    """返回小节实际存在的文件；path本身不存在时依次查找其他格式，都没有时返回None"""
+    if os.path.exists(path):
+        return path
+    stem = episode_stem(path)
+    for suffix in EPISODE_FORMATS.values():
+        candidate = stem + suffix
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def remove_other_formats(path):
+    """删除同一小节其他格式的旧文件，保证每个小节只有一个文件"""
+    stem = episode_stem(path)
+    for suffix in EPISODE_FORMATS.values():
+        candidate = stem + suffix
+        if candidate != path and os.path.exists(candidate):
+            os.remove(candidate)
+
+
+def fsync_file(path):
+    """把已关闭文件的内容刷到磁盘（压缩流关闭后才写完，只能按路径重新打开）"""
+    fd = os.open(path, os.O_RDWR)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_directory(directory):
+    """改名后同步目录项，断电后改名也不会丢；Windows不支持打开目录，直接跳过"""
+    try:
+        fd = os.open(directory or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_write(path, mode='w'):
+    """写到 <路径>.tmp，fsync后原子地替换正式文件；写入中途出错或进程被杀时正式文件保持原样
+
+    with atomic_write(path, 'wb') as f:
+        json_backend.dump(data, f, indent=True)
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    encoding = None if "b" in mode else "utf-8"
+    try:
+        with open(tmp_path, mode, encoding=encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    fsync_directory(directory)
+
+
+def remove_temp_files(path):
+    """删除小节各种格式残留的 .tmp 文件（上次写入时进程被中断）"""
+    stem = episode_stem(path)
+    removed = 0
+    for suffix in EPISODE_FORMATS.values():
+        try:
+            os.remove(f"{stem}{suffix}.tmp")
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def _open_stream(path, mode, fmt):
+    """按格式以二进制方式打开文件，mode为 "r" 或 "w"，读取时可以按行遍历"""
+    if fmt == "gzip":
+        return gzip.open(path, mode + "b", compresslevel=GZIP_LEVEL)
+    if fmt == "zstd":
+        if zstandard is None:
+            raise RuntimeError(f"读写 {path} 需要安装zstandard（pip install zstandard）")
+        raw = open(path, mode + "b")
+        if mode == "w":
+            return zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw, closefd=True)
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True))
+    return open(path, mode + "b")
+
+
+class JsonlWriter:
+    """逐条追加写入JSONL（每行一条对话），写到 <路径>.tmp，commit()时fsync并原子地改名为正式文件
+
+    压缩方式由文件后缀决定（.jsonl / .jsonl.gz / .jsonl.zst）。不压缩时每写一条就flush，
+    抓取过程中可以对 .tmp 文件做tail；中途出错时临时文件被删除，已有的正式文件不受影响。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        self.format = path_format(path)
+        self.flush_each = self.format == "jsonl"
+        self.count = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = _open_stream(self.tmp_path, "w", self.format)
+
+    def write(self, record):
+        self.file.write(json_backend.dumps(record) + b"\n")
+        self.count += 1
+        if self.flush_each:
+            self.file.flush()
+
+    def write_all(self, records):
+        for record in records:
+            self.write(record)
+
+    def commit(self):
+        self.file.close()
+        fsync_file(self.tmp_path)
+        os.replace(self.tmp_path, self.path)
+        fsync_directory(os.path.dirname(self.path))
+        remove_other_formats(self.path)
+
+    def abort(self):
+        self.file.close()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
+
+
+def iter_episode_records(path):
+    """逐条读取小节文件中的对话；.json文件整体解析后逐条产出，JSONL按行解码"""
+    fmt = path_format(path)
+    if fmt == "json":
+        yield from json_backend.load_path(path)
+        return
+    with _open_stream(path, "r", fmt) as f:
+        for line in f:
+            if line.strip():
+                yield json_backend.loads(line)
+
+
+def read_episode_file(path):
+    """读取一个小节的对话列表，path可以是 <小节>.json 键或任意格式的实际文件；不存在时返回None"""
+    actual_path = resolve_episode_path(path)
+    if actual_path is None:
+        return None
+    return list(iter_episode_records(actual_path))
+
+
+def write_episode_file(path, dialogues, fmt=DEFAULT_FORMAT):
+    """按指定格式保存一个小节，返回实际写入的文件路径
+
+    json格式与原来一样缩进保存；其余格式逐条写入JSONL。同一小节其他格式的旧文件会被删除。
+    """
+    target = format_path(path, fmt)
+    if fmt == "json":
+        with atomic_write(target, 'wb') as f:
+            json_backend.dump(dialogues, f, indent=True)
+        remove_other_formats(target)
+    else:
+        with JsonlWriter(target) as writer:
+            writer.write_all(dialogues)
+    return target
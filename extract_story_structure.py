@@ -1,6 +1,13 @@
 import os
 from bs4 import BeautifulSoup
-import json
+from lxml import etree
+import json_backend
+from story_parser import element_text
+from episode_io import atomic_write
+
+# 剧情一览页面中主线和支线所在标签页的标题
+MAIN_STORY_TAB = "主线故事"
+SIDE_STORY_TAB = "活动支线"
 
 # 读取HTML文件
 def read_html_file(file_path):
@@ -8,8 +15,8 @@ def read_html_file(file_path):
         return file.read()
 
 # 提取故事结构
-def extract_story_structure(html_content):
-    soup = BeautifulSoup(html_content, 'lxml')
+def extract_story_structure(html_content, parser='lxml'):
+    soup = BeautifulSoup(html_content, parser)
     
     # 查找主线故事容器
     main_story_tab = soup.find_all(class_='tabber-item')[1]
@@ -64,30 +71,138 @@ def extract_story_structure(html_content):
         story_structure["side_story"].append(chapter_data)
 
     return story_structure
+
+
+# 以下是流式提取：用lxml iterparse按文档顺序只扫描一遍页面，
+# 每个章节的小节列表解析完就立即产出，处理过的元素随即释放，不保留整棵DOM
+
+def _has_class(element, name):
+    return name in element.get("class", "").split()
+
+
+_HEADLINE = etree.XPath(".//span[contains(concat(' ', normalize-space(@class), ' '), ' mw-headline ')]")
+_TITLE_COLUMN = etree.XPath(".//span[@style='display: flex;flex-direction: column;']")
+_EPISODES = etree.XPath(".//div[contains(concat(' ', normalize-space(@class), ' '), ' episode-list--single ')]")
+_ENG_DIV = etree.XPath(".//div[contains(concat(' ', normalize-space(@class), ' '), ' episode-list--eng ')]")
+_SPAN_LINK = etree.XPath(".//span[contains(concat(' ', normalize-space(@class), ' '), ' span-link ')]")
+
+
+def _parse_episodes(episode_list):
+    episodes = []
+    for episode in _EPISODES(episode_list):
+        main_div = episode.find(".//div")
+        title_links = [
+            a for a in main_div.iterfind(".//a[@href]")
+            if element_text(a).strip() and not _SPAN_LINK(a)
+        ]
+        if title_links:
+            cn_a = title_links[0]
+            eng_divs = _ENG_DIV(episode)
+            episodes.append({
+                "chinese_title": element_text(cn_a).strip(),
+                "english_title": element_text(eng_divs[0]).strip() if eng_divs else "",
+                "link": cn_a.get("href"),
+            })
+    return episodes
+
+
+def _release(element):
+    """释放已经处理完的元素及其前面的兄弟节点"""
+    element.clear(keep_tail=True)
+    parent = element.getparent()
+    if parent is not None:
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+def iter_story_chapters(source):
+    """流式遍历剧情一览页面中所有标签页的章节，产出 (标签页标题, 章节数据)
+
+    source可以是文件路径或二进制文件对象。章节标题(h2)之后的第一个小节列表
+    属于该章节，与extract_story_structure中find_next的规则相同。
+    """
+    current_tab = None
+    tab_depth = h2_depth = list_depth = 0
+    pending = []
+    ch_title = en_title = None
+
+    for event, element in etree.iterparse(source, events=("start", "end"), html=True, encoding="utf-8"):
+        tag = element.tag
+        is_tab = tag == "div" and _has_class(element, "tabber-item")
+        is_list = tag == "div" and _has_class(element, "episode-list")
+
+        if event == "start":
+            if is_tab:
+                tab_depth += 1
+                if tab_depth == 1:
+                    current_tab = element.get("data-title")
+            elif tag == "h2":
+                h2_depth += 1
+            elif is_list:
+                list_depth += 1
+            continue
+
+        if is_tab:
+            tab_depth -= 1
+            if tab_depth == 0:
+                current_tab = None
+        elif tag == "h2":
+            h2_depth -= 1
+            if current_tab is not None and h2_depth == 0:
+                headlines = _HEADLINE(element)
+                if headlines:
+                    title_columns = _TITLE_COLUMN(headlines[0])
+                    if title_columns:
+                        ch_title = element_text(title_columns[0].find(".//span"), strip=True)
+                        en_title = element_text(title_columns[0].find(".//small").find(".//span"), strip=True)
+                    pending.append((current_tab, {
+                        "chinese_title": ch_title,
+                        "english_title": en_title,
+                        "episodes": [],
+                    }))
+        elif is_list:
+            list_depth -= 1
+            if list_depth == 0 and pending:
+                episodes = _parse_episodes(element)
+                for tab_title, chapter_data in pending:
+                    chapter_data["episodes"] = list(episodes)
+                    yield tab_title, chapter_data
+                pending = []
+
+        # 章节标题和小节列表内部的元素要等整块解析完才能释放
+        if h2_depth == 0 and list_depth == 0:
+            _release(element)
+
+
+def extract_all_story_structures(source):
+    """一次扫描提取所有标签页的故事结构，返回 {标签页标题: [章节, ...]}"""
+    structures = {}
+    for tab_title, chapter_data in iter_story_chapters(source):
+        structures.setdefault(tab_title, []).append(chapter_data)
+    return structures
+
+
 # 保存为JSON文件
 def save_to_json(data, output_path):
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    with atomic_write(output_path, 'wb') as f:
+        json_backend.dump(data, f, indent=True)
     print(f"数据已保存到 {output_path}")
 
 def main():
     # 输入和输出文件路径
-    html_file_path = "d:\\errorhassei\\project\\reverse_crawler\\storys.html"
-    output_dir = "d:\\errorhassei\\project\\reverse_crawler\\output"
-    output_file = os.path.join(output_dir, "side_story_structure.json")
-    
+    html_file_path = os.path.join("html", "storys.html")
+    output_dir = "output"
+
     # 创建输出目录
     os.makedirs(output_dir, exist_ok=True)
-    
-    # 读取HTML文件
-    html_content = read_html_file(html_file_path)
-    
-    # 提取故事结构
-    story_structure = extract_story_structure(html_content)
-    
-    if story_structure:
+
+    # 一次扫描同时提取主线和支线结构
+    structures = extract_all_story_structures(html_file_path)
+
+    if structures.get(MAIN_STORY_TAB) and structures.get(SIDE_STORY_TAB):
         # 保存为JSON文件
-        save_to_json(story_structure, output_file)
+        save_to_json({"main_story": structures[MAIN_STORY_TAB]}, os.path.join(output_dir, "story_structure.json"))
+        save_to_json({"side_story": structures[SIDE_STORY_TAB]}, os.path.join(output_dir, "side_story_structure.json"))
         print("故事结构提取完成！")
     else:
         print("提取故事结构失败")
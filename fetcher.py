@@ -0,0 +1,166 @@
+import re
+import time
+import threading
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup
+from browser_pool import get_browser_pool, USER_AGENT
+from page_cache import get_page_cache, is_replay
+from throttle import get_throttle, parse_retry_after, is_throttled_status
+
+
+# 普通HTTP请求使用的请求头（与浏览器保持一致）
+HEADERS = {
+    "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8",
+    "accept-language": "zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6",
+    "upgrade-insecure-requests": "1",
+    "user-agent": USER_AGENT,
+}
+
+HTTP_TIMEOUT = 15
+POOL_MAXSIZE = 10
+# 遇到429/5xx时最多请求几次，等待时间由站点限流器决定
+HTTP_MAX_ATTEMPTS = 3
+
+# 各站点页面中必须出现的内容标记，缺失说明页面没有正常渲染
+SITE_MARKERS = {
+    "res1999.huijiwiki.com": re.compile(r'<div[^>]*\bclass="[^"]*\bstory-text\b'),
+    "reverse1999.fandom.com": re.compile(r'<table[^>]*\bclass="[^"]*\bwikitable\b'),
+}
+
+# 浏览器访问时等待出现的正文元素
+SITE_SELECTORS = {
+    "res1999.huijiwiki.com": "div.story-text",
+    "reverse1999.fandom.com": "table.wikitable",
+}
+
+# 反爬验证页面的特征
+CHALLENGE_PATTERNS = [
+    "cf-challenge",
+    "cf_chl_opt",
+    "challenge-platform",
+    "<title>Just a moment...</title>",
+]
+
+_local = threading.local()
+
+
+def get_session():
+    """获取当前线程的keep-alive会话，连接在多次请求间复用"""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        # 只在连接层重试，429/5xx交给站点限流器处理
+        retry = Retry(total=2, connect=2, read=0, status=0, backoff_factor=1, allowed_methods=["GET"])
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update(HEADERS)
+        _local.session = session
+    return session
+
+
+def is_challenge_page(html):
+    """判断返回的是否是反爬验证页面"""
+    head = html[:20000]
+    return any(pattern in head for pattern in CHALLENGE_PATTERNS)
+
+
+def has_expected_content(url, html):
+    """检查页面是否包含该站点的内容标记，未知站点只要求非空"""
+    marker = SITE_MARKERS.get(urlparse(url).netloc)
+    if marker is None:
+        return bool(html)
+    return marker.search(html) is not None
+
+
+class ServerBusyError(Exception):
+    """服务器多次返回429/5xx，不再换用浏览器加重负担"""
+
+
+def throttled_request(method, url, **kwargs):
+    """经过站点限流器发送请求，429/5xx时按限流器的节奏重试
+
+    返回最后一次的响应；连接出错时抛出requests.RequestException，
+    多次429/5xx后抛出ServerBusyError，站点熔断时抛出CircuitOpenError。
+    """
+    throttle = get_throttle(url)
+    session = get_session()
+    for attempt in range(HTTP_MAX_ATTEMPTS):
+        throttle.acquire()
+        start = time.monotonic()
+        try:
+            response = session.request(method, url, **kwargs)
+        except requests.RequestException:
+            throttle.release(None, time.monotonic() - start)
+            if attempt == HTTP_MAX_ATTEMPTS - 1:
+                raise
+            continue
+
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        throttle.release(response.status_code, time.monotonic() - start, retry_after)
+        if not is_throttled_status(response.status_code):
+            return response
+        print(f"请求 {url} 返回状态码 {response.status_code}，第 {attempt+1}/{HTTP_MAX_ATTEMPTS} 次")
+    raise ServerBusyError(f"{url} 多次返回状态码 {response.status_code}")
+
+
+def get_page_content_from_http(url, timeout=HTTP_TIMEOUT):
+    """用普通HTTP请求获取页面HTML，页面不可用时返回None
+
+    服务器繁忙（429/5xx）或站点熔断时抛出异常，不再换用浏览器。
+    """
+    try:
+        response = throttled_request("GET", url, timeout=timeout)
+    except requests.RequestException as e:
+        print(f"HTTP请求 {url} 失败: {e}")
+        return None
+
+    if response.status_code != 200:
+        print(f"HTTP请求 {url} 返回状态码 {response.status_code}")
+        return None
+
+    html = response.text
+    if is_challenge_page(html):
+        print(f"HTTP请求 {url} 遇到验证页面")
+        return None
+    if not has_expected_content(url, html):
+        print(f"HTTP请求 {url} 的页面缺少内容标记")
+        return None
+    return html
+
+
+def get_page_content_from_selenium(url, max_retries=3):
+    """使用共享浏览器池从URL获取页面HTML，每次重试都经过站点限流器"""
+    print(f"使用Selenium访问 {url}...")
+    wait_selector = SITE_SELECTORS.get(urlparse(url).netloc)
+    return get_browser_pool().fetch(url, max_retries=max_retries, wait_selector=wait_selector)
+
+
+def fetch_html(url, use_browser=True, use_cache=True):
+    """优先用HTTP获取页面，失败或内容不完整时再交给浏览器
+
+    获取到的原始页面会写入缓存；回放模式下只从缓存读取，不访问网络。
+    """
+    if is_replay():
+        html = get_page_cache().get(url)
+        if html is None:
+            print(f"回放模式: 缓存中没有 {url}")
+        return html
+
+    html = get_page_content_from_http(url)
+    if html is None and use_browser:
+        html = get_page_content_from_selenium(url)
+    if html is not None and use_cache:
+        get_page_cache().put(url, html)
+    return html
+
+
+def fetch_soup(url, use_browser=True):
+    """获取页面并返回BeautifulSoup对象，失败返回None"""
+    html = fetch_html(url, use_browser=use_browser)
+    if html is None:
+        return None
+    return BeautifulSoup(html, "lxml")
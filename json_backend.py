@@ -0,0 +1,88 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+# 可选的JSON实现，默认使用第一个已安装的；orjson/msgspec是C/Rust实现，比标准库快数倍
+BACKENDS = ("orjson", "msgspec", "json")
+
+
+def available_backends():
+    installed = {"orjson": orjson is not None, "msgspec": msgspec is not None, "json": True}
+    return [name for name in BACKENDS if installed[name]]
+
+
+_backend = available_backends()[0]
+
+
+def set_backend(name):
+    """切换JSON实现，如 set_backend("json") 强制使用标准库"""
+    global _backend
+    if name not in available_backends():
+        raise ValueError(f"JSON后端 {name} 不可用，可选: {', '.join(available_backends())}")
+    _backend = name
+
+
+def get_backend():
+    return _backend
+
+
+def dumps(obj, indent=False):
+    """序列化为UTF-8字节，中文不转义；indent为True时缩进两格，否则输出不带空格的紧凑格式（用于JSONL）
+
+    语料中的值（字符串、整数、小数形式的浮点数）用任一后端的缩进输出都与
+    json.dump(obj, f, ensure_ascii=False, indent=2) 逐字节相同；其他值不保证，
+    如orjson把1e-05写成0.00001、1e+16写成1e16。orjson不支持的值（超过64位的整数等）
+    自动改用标准库。
+    """
+    if _backend == "orjson":
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        try:
+            return orjson.dumps(obj, option=option)
+        except orjson.JSONEncodeError:
+            return _stdlib_dumps(obj, indent)
+    if _backend == "msgspec":
+        data = msgspec.json.encode(obj)
+        return msgspec.json.format(data, indent=2) if indent else data
+    return _stdlib_dumps(obj, indent)
+
+
+def _stdlib_dumps(obj, indent):
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data):
+    """解析str或bytes，格式错误时统一抛出ValueError"""
+    if _backend == "orjson":
+        return orjson.loads(data)
+    if _backend == "msgspec":
+        try:
+            return msgspec.json.decode(data)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+    return json.loads(data)
+
+
+def load(f):
+    """从以二进制方式打开的文件读取"""
+    return loads(f.read())
+
+
+def dump(obj, f, indent=False):
+    """写入以二进制方式打开的文件"""
+    f.write(dumps(obj, indent))
+
+
+def load_path(path):
+    with open(path, 'rb') as f:
+        return load(f)
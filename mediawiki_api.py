@@ -0,0 +1,227 @@
+import sys
+import html
+from urllib.parse import unquote
+from bs4 import BeautifulSoup
+from fetcher import throttled_request, has_expected_content
+from sources import SOURCES
+from revision_store import record_revisions
+from crawl_manifest import get_manifest
+from episode_io import write_episode_file, DEFAULT_FORMAT
+
+
+# 两个wiki都是MediaWiki站点，直接通过api.php获取页面内容，不需要浏览器
+# MediaWiki对普通用户的titles参数上限为50
+BATCH_SIZE = 50
+API_TIMEOUT = 60
+# 批量渲染时每批结果HTML的大小上限；MediaWiki默认的展开大小上限为2MB，超出后剩下的嵌入不会展开
+BATCH_BYTES = 1024 * 1024
+# 还没有渲染过页面时按一个剧情页的大小估计每批的页面数（fandom的剧情页渲染后约158KB）
+PAGE_BYTES_ESTIMATE = 160 * 1024
+
+
+def api_url(base_url):
+    return f"{base_url}/api.php"
+
+
+def link_to_title(link):
+    """把 /wiki/%E5%BA%8F%E7%AB%A0-01 这样的链接转换成页面标题 序章-01"""
+    title = link.split("/wiki/", 1)[-1]
+    return unquote(title).replace("_", " ")
+
+
+def chunked(items, size=BATCH_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def api_request(base_url, params, post=False):
+    """调用api.php并返回JSON，出错时抛出异常"""
+    params = dict(params, format="json", formatversion=2)
+    if post:
+        response = throttled_request("POST", api_url(base_url), data=params, timeout=API_TIMEOUT)
+    else:
+        response = throttled_request("GET", api_url(base_url), params=params, timeout=API_TIMEOUT)
+    response.raise_for_status()
+    data = response.json()
+    if "error" in data:
+        raise RuntimeError(f"API错误: {data['error'].get('info', data['error'])}")
+    return data
+
+
+def resolve_titles(query, titles):
+    """根据API返回的normalized/redirects映射，把最终页面标题对应回请求的标题"""
+    mapping = {title: title for title in titles}
+    for key in ("normalized", "redirects"):
+        for item in query.get(key, []):
+            for original, target in mapping.items():
+                if target == item["from"]:
+                    mapping[original] = item["to"]
+    return mapping
+
+
+def query_revisions(base_url, titles, content=False):
+    """批量查询页面的最新修订信息，每个请求最多50个标题
+
+    返回 {请求的标题: {"revid", "timestamp", "content"(可选)}}，不存在的页面不在结果中
+    """
+    result = {}
+    prop = "ids|timestamp|content" if content else "ids|timestamp"
+    for batch in chunked(list(titles)):
+        params = {
+            "action": "query",
+            "prop": "revisions",
+            "rvprop": prop,
+            "rvslots": "main",
+            "redirects": 1,
+            "titles": "|".join(batch),
+        }
+        query = api_request(base_url, params, post=True).get("query", {})
+        mapping = resolve_titles(query, batch)
+        pages = {page["title"]: page for page in query.get("pages", [])}
+        for title, target in mapping.items():
+            page = pages.get(target)
+            if not page or page.get("missing") or not page.get("revisions"):
+                continue
+            revision = page["revisions"][0]
+            info = {"revid": revision["revid"], "timestamp": revision["timestamp"]}
+            if content:
+                info["content"] = revision["slots"]["main"]["content"]
+            result[title] = info
+    return result
+
+
+def render_page(base_url, title):
+    """用action=parse渲染单个页面，只返回正文HTML，不包含皮肤"""
+    params = {
+        "action": "parse",
+        "page": title,
+        "prop": "text",
+        "redirects": 1,
+        "disablelimitreport": 1,
+        "disableeditsection": 1,
+    }
+    return api_request(base_url, params)["parse"]["text"]
+
+
+def render_pages(base_url, titles, batch_bytes=BATCH_BYTES):
+    """批量渲染页面正文HTML
+
+    每批用一个action=parse请求，通过嵌入 {{:标题}} 一次渲染多个页面，
+    再按包裹的div拆分。每批的页面数按已渲染页面中最大的HTML大小估算，使一批不超过batch_bytes。
+    某个页面在批量结果中缺失，或者div中没有正文标记（超出展开上限、嵌入失败）时单独渲染。
+    """
+    result = {}
+    titles = list(titles)
+    largest_page = 0
+    start = 0
+    while start < len(titles):
+        count = max(1, min(BATCH_SIZE, batch_bytes // (largest_page or PAGE_BYTES_ESTIMATE)))
+        batch = titles[start:start + count]
+        start += count
+        parts = []
+        for title in batch:
+            parts.append(f'<div class="api-batch-page" data-title="{html.escape(title)}">\n{{{{:{title}}}}}\n</div>')
+        params = {
+            "action": "parse",
+            "title": "API",
+            "text": "\n".join(parts),
+            "contentmodel": "wikitext",
+            "prop": "text",
+            "disablelimitreport": 1,
+            "disableeditsection": 1,
+        }
+        try:
+            text = api_request(base_url, params, post=True)["parse"]["text"]
+            soup = BeautifulSoup(text, "lxml")
+            for div in soup.find_all("div", class_="api-batch-page"):
+                title = div.get("data-title")
+                if title in batch and title not in result:
+                    page_html = str(div)
+                    largest_page = max(largest_page, len(page_html.encode("utf-8")))
+                    if has_expected_content(api_url(base_url), page_html):
+                        result[title] = page_html
+        except Exception as e:
+            print(f"批量渲染失败，改为逐页渲染: {e}")
+
+        for title in batch:
+            if title in result:
+                continue
+            try:
+                page_html = render_page(base_url, title)
+            except Exception as e:
+                print(f"渲染页面 {title} 失败: {e}")
+                continue
+            largest_page = max(largest_page, len(page_html.encode("utf-8")))
+            result[title] = page_html
+    return result
+
+
+def crawl_source(source_name, chapter_filter=None, skip_existing=True, output_format=DEFAULT_FORMAT):
+    """通过API抓取一个数据源的所有小节并保存为JSON"""
+    source = SOURCES[source_name]
+    manifest = get_manifest()
+    episodes = list(source.iter_episodes(chapter_filter))
+    pending = []
+    for chapter_title, episode_title, link in episodes:
+        page_title = link_to_title(link)
+        episode_filepath = source.episode_path(chapter_title, episode_title)
+        if skip_existing and manifest.is_crawled(episode_filepath):
+            continue
+        pending.append((episode_filepath, episode_title, page_title, link))
+
+    print(f"{source_name}: 共 {len(episodes)} 个小节，需要抓取 {len(pending)} 个")
+    page_titles = [page_title for _, _, page_title, _ in pending]
+    # 先取修订号再渲染，页面在两次请求之间被编辑时下次刷新会重新抓取
+    revisions = query_revisions(source.base_url, page_titles) if page_titles else {}
+    # 与pipeline相同，渲染前先把小节记为处理中，写入前进程被杀时下次运行可以找到它们
+    for episode_filepath, _, _, link in pending:
+        manifest.mark_started(episode_filepath, url=source.url(link), source=source_name)
+    pages = render_pages(source.base_url, page_titles)
+
+    saved = 0
+    saved_revisions = {}
+    for episode_filepath, episode_title, page_title, link in pending:
+        url = source.url(link)
+        page_html = pages.get(page_title)
+        if not page_html:
+            print(f"  警告: 未能获取 {episode_title} ({page_title})，将在下次运行时重试")
+            manifest.mark_failed(episode_filepath, "未获取到页面", url=url, source=source_name)
+            continue
+        dialogues = source.parse(page_html)
+        if not dialogues:
+            print(f"  警告: 未能从 {episode_title} 提取到对话，将在下次运行时重试")
+            manifest.mark_failed(episode_filepath, "未提取到对话", url=url, source=source_name)
+            continue
+        write_episode_file(episode_filepath, dialogues, output_format)
+        manifest.mark_done(episode_filepath, dialogues, url=url, source=source_name)
+        saved += 1
+        print(f"  {episode_title}: 成功提取 {len(dialogues)} 条对话")
+        if page_title in revisions:
+            saved_revisions[link] = revisions[page_title]
+
+    if saved_revisions:
+        record_revisions(source_name, saved_revisions)
+
+    print(f"{source_name}: 新保存 {saved} 个小节")
+    return saved
+
+
+def main():
+    # 用法: python mediawiki_api.py [cn_main|cn_side|en_side ...] [--chapter 章节标题] [--format json|jsonl|gzip|zstd]
+    args = sys.argv[1:]
+    chapter_filter = None
+    output_format = DEFAULT_FORMAT
+    if "--format" in args:
+        index = args.index("--format")
+        output_format = args[index + 1]
+        del args[index:index + 2]
+    if "--chapter" in args:
+        index = args.index("--chapter")
+        chapter_filter = args[index + 1]
+        del args[index:index + 2]
+    for source_name in args or list(SOURCES):
+        crawl_source(source_name, chapter_filter, output_format=output_format)
+
+
+if __name__ == "__main__":
+    main()
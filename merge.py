@@ -1,75 +1,184 @@
-import json
+import os
+import sys
+import json_backend
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from story_index import load_story_index, iter_bilingual_episodes, OUTPUT_DIR
+from sentence_aligner import align_episode
+from speaker_map import load_speaker_map, speaker_map_hash
+from corpus_reader import load_episode
+from episode_io import read_episode_file, atomic_write
+from crawl_manifest import dialogues_hash
+
+# 置信度（后验概率）低于该值的对齐结果会被提示，即同一位置有其他对齐方式比它更可能
+# NS朔日手记中2851条逐行对应的对话只有9条低于该值（原来按长度概率、阈值0.05时有129条）
+LOW_CONFIDENCE = 0.5
+
+# 记录每个小节上次对齐时中英文输入文件的哈希，输入没变的小节不重新对齐
+ALIGN_STATE_PATH = os.path.join(OUTPUT_DIR, "alignment_state.json")
+# 每对齐完一个小节就追加一行，中途被杀时已完成的小节不会丢；save_align_state后清空
+ALIGN_JOURNAL_PATH = os.path.join(OUTPUT_DIR, "alignment_state.journal")
+DEFAULT_WORKERS = os.cpu_count() or 2
 
 def load_story_dialogues(path):
-    """加载故事结构数据"""
-    structure_path = path
+    """加载小节对话（经过corpus_reader的LRU缓存）"""
     try:
-        with open(structure_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return load_episode(path)
     except Exception as e:
         print(f"加载故事结构数据失败: {e}")
         return None
 
-def align_dialogues(chinese_dialogues, english_dialogues, filename):
-    """基于数量校验的精确顺序匹配"""
-    print(f"🔍 开始对齐校验 | 中文: {len(chinese_dialogues)}条 | 英文: {len(english_dialogues)}条")
-    
-    if len(chinese_dialogues) != len(english_dialogues):
-        # 新增详细差异定位
-        for i, (cn, en) in enumerate(zip(chinese_dialogues, english_dialogues)):
-            if cn["dialogue"] != en["english_dialogue"]:
-                print(f"⚠️ 第{i+1}条对话不匹配：")
-                print(f"   中文：{cn['dialogue']}")
-                print(f"   英文：{en['english_dialogue']}")
-                import sys
-                sys.exit(1)  # 新增系统退出
-                break
-        return
-    
-    aligned_data = []
-    
-    # 使用zip进行精确顺序匹配
-    for cn, en in zip(chinese_dialogues, english_dialogues):
-        aligned_data.append({
-            "chinese_speaker": cn["speaker"],
-            "chinese_text": cn["dialogue"],
-            "english_speaker": en["english_speaker"],
-            "english_text": en["english_dialogue"]
-        })
-
-    json.dump(aligned_data, open("output/en_side_dialogues/Notes on Shuori/" + filename + ".json", "w", encoding="utf-8"), ensure_ascii=False, indent=2)
-    print(f"✅ 已将对齐后的对话保存到 " + "outoutput/en_side_dialogues/Notes on Shuori/" + filename + ".json")
-    
-
-def test():
-    # english_json = r"D:\\errorhassei\\project\\reverse1999\\output\\Notes on Shuori\\NS-01.json"
-    # chinese_json = r"D:\\errorhassei\\project\\reverse1999\\output\\side_dialogues\\NS朔日手记\\启程的祷声.json"
-    # # 加载故事结构
-    # english_dialogue = load_story_dialogues(english_json)
-    # chinese_dialogue = load_story_dialogues(chinese_json)
-    # align_dialogues(chinese_dialogue, english_dialogue)
-
-    side_story_structure = load_story_dialogues(r"D:\\errorhassei\\project\\reverse1999\\output\\side_story_structure.json")
-    for chapter in side_story_structure["side_story"]:
-        if chapter["chinese_title"] != "NS朔日手记":
+def save_aligned(aligned_data, output_path):
+    with atomic_write(output_path, 'wb') as f:
+        json_backend.dump(aligned_data, f, indent=True)
+
+
+def episode_hash(path):
+    # path是 <小节>.json 键，对话可能保存为JSONL或压缩格式；按解码后的对话计算哈希，
+    # 同样的对话换一种格式保存、或gzip头中的时间戳变化都不会触发重新对齐
+    try:
+        dialogues = read_episode_file(path)
+    except (OSError, ValueError, EOFError):
+        return None
+    if dialogues is None:
+        return None
+    return dialogues_hash(dialogues)
+
+
+def load_align_state(path=ALIGN_STATE_PATH, journal_path=ALIGN_JOURNAL_PATH):
+    """加载上次对齐的记录 {小节ID: {"cn_hash", "en_hash", "aligned_path", "speaker_map_hash"}}
+
+    上次运行中断时，日志中已完成的小节也会合并进来
+    """
+    try:
+        state = json_backend.load_path(path)
+    except (OSError, ValueError):
+        state = {}
+    try:
+        with open(journal_path, 'rb') as f:
+            for line in f:
+                try:
+                    episode_id, record = json_backend.loads(line)
+                except ValueError:
+                    # 最后一行可能只写了一半
+                    break
+                state[episode_id] = record
+    except OSError:
+        pass
+    return state
+
+
+def append_align_journal(episode_id, record, journal_path=ALIGN_JOURNAL_PATH):
+    os.makedirs(os.path.dirname(journal_path), exist_ok=True)
+    with open(journal_path, 'ab') as f:
+        f.write(json_backend.dumps([episode_id, record]) + b"\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def save_align_state(state, path=ALIGN_STATE_PATH, journal_path=ALIGN_JOURNAL_PATH):
+    with atomic_write(path, 'wb') as f:
+        json_backend.dump(state, f, indent=True)
+    # 日志中的内容都已写进状态文件
+    try:
+        os.remove(journal_path)
+    except OSError:
+        pass
+
+
+def align_entry(entry, speaker_map=None):
+    """对齐索引中的一个小节并保存（模块级函数，可以交给进程池执行），返回统计信息"""
+    chinese_dialogue = load_story_dialogues(entry["cn_path"])
+    english_dialogue = load_story_dialogues(entry["en_path"])
+    aligned_data = align_episode(chinese_dialogue, english_dialogue, speaker_map)
+    save_aligned(aligned_data, entry["aligned_path"])
+    return {
+        "pairs": len(aligned_data),
+        "merged": sum(1 for item in aligned_data if item["alignment"] != "1:1"),
+        "uncertain": sum(1 for item in aligned_data if item["confidence"] < LOW_CONFIDENCE),
+    }
+
+
+def find_pending_entries(index, state, chapter_filter=None, force=False, map_hash=None):
+    """找出需要重新对齐的小节，返回 [(小节信息, 中文哈希, 英文哈希), ...] 和跳过的数量
+
+    说话人对照表变化后所有小节都要重新对齐
+    """
+    pending = []
+    skipped = 0
+    for entry in iter_bilingual_episodes(index, chapter_filter):
+        cn_hash = episode_hash(entry["cn_path"])
+        en_hash = episode_hash(entry["en_path"])
+        if cn_hash is None or en_hash is None:
+            print(f"跳过 {entry['id']} {entry['chinese_title']}：缺少中文或英文对话")
+            skipped += 1
+            continue
+        previous = state.get(entry["id"])
+        if (not force and previous
+                and previous["cn_hash"] == cn_hash and previous["en_hash"] == en_hash
+                and previous["aligned_path"] == entry["aligned_path"]
+                and previous.get("speaker_map_hash") == map_hash
+                and os.path.exists(entry["aligned_path"])):
+            skipped += 1
             continue
-        chapter_cn_title = chapter["chinese_title"]
-        chapter_en_title = chapter["english_title"]
-        for episode in chapter["episodes"]:
-            episode_cn_title = episode["chinese_title"]
-            episode_en_title = episode["english_title"]
-            link = episode["link"]
-            english_file_name = link.split('/')[-1]
-            english_json = r"D:\\errorhassei\\project\\reverse1999\\output\\Notes on Shuori\\" + english_file_name + ".json"
-            chinese_json = r"D:\\errorhassei\\project\\reverse1999\\output\\side_dialogues\\NS朔日手记\\" + episode_cn_title + ".json"
-            # 加载故事结构
-            english_dialogue = load_story_dialogues(english_json)
-            chinese_dialogue = load_story_dialogues(chinese_json)
-            align_dialogues(chinese_dialogue, english_dialogue, english_file_name + " " + episode_cn_title)
-        # 加载故事结构          
+        pending.append((entry, cn_hash, en_hash))
+    return pending, skipped
+
+
+def align_corpus(chapter_filter=None, workers=DEFAULT_WORKERS, force=False):
+    """用进程池对齐所有有中英文对话的小节，中英文输入都没变的小节跳过"""
+    index = load_story_index()
+    state = load_align_state()
+    speaker_map = load_speaker_map()
+    map_hash = speaker_map_hash(speaker_map)
+    pending, skipped = find_pending_entries(index, state, chapter_filter, force, map_hash)
+    print(f"待对齐 {len(pending)} 个小节，输入未变化或缺少对话而跳过 {skipped} 个")
+
+    stats = {"aligned": 0, "failed": 0, "skipped": skipped}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(align_entry, entry, speaker_map): (entry, cn_hash, en_hash) for entry, cn_hash, en_hash in pending}
+        for future in as_completed(futures):
+            entry, cn_hash, en_hash = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"❌ {entry['id']} {entry['chinese_title']} 对齐失败: {e}")
+                stats["failed"] += 1
+                continue
+            state[entry["id"]] = {
+                "cn_hash": cn_hash,
+                "en_hash": en_hash,
+                "aligned_path": entry["aligned_path"],
+                "speaker_map_hash": map_hash,
+            }
+            append_align_journal(entry["id"], state[entry["id"]])
+            stats["aligned"] += 1
+            warnings = ""
+            if result["merged"] or result["uncertain"]:
+                warnings = f"，⚠️ 非逐行对应 {result['merged']} 处，低置信度 {result['uncertain']} 条"
+            print(f"✅ {entry['id']} {entry['chinese_title']}: {result['pairs']} 对{warnings}")
+
+    save_align_state(state)
+    return stats
+
 
+def main():
+    # 用法: python merge.py [中文章节标题] [--workers N] [--force]
+    # 不指定章节时对齐所有有英文页面的小节；中英文小节通过story_index.json中的小节ID对应
+    # 中英文对话文件都没有变化的小节会跳过，--force 全部重新对齐
+    args = sys.argv[1:]
+    force = "--force" in args
+    if force:
+        args.remove("--force")
+    workers = DEFAULT_WORKERS
+    if "--workers" in args:
+        index = args.index("--workers")
+        workers = int(args[index + 1])
+        del args[index:index + 2]
+    chapter_filter = args[0] if args else None
 
+    stats = align_corpus(chapter_filter, workers=workers, force=force)
+    print(f"\n对齐完成：新对齐 {stats['aligned']} 个，跳过 {stats['skipped']} 个，失败 {stats['failed']} 个")
 
 
 if __name__ == "__main__":
-    test()
+    main()
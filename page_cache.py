@@ -0,0 +1,128 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import threading
+
+
+# 原始页面缓存目录：blobs按内容哈希存放gzip压缩的HTML，index按URL哈希存放元数据
+CACHE_DIR = os.path.join("cache", "pages")
+
+
+def sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class PageCache:
+    """按URL索引、按内容哈希存储的原始页面缓存，相同内容只保存一份"""
+
+    def __init__(self, root=CACHE_DIR):
+        self.root = root
+        self.index_dir = os.path.join(root, "index")
+        self.blob_dir = os.path.join(root, "blobs")
+
+    def _index_path(self, url):
+        key = sha256(url)
+        return os.path.join(self.index_dir, key[:2], f"{key}.json")
+
+    def _blob_path(self, content_hash):
+        return os.path.join(self.blob_dir, content_hash[:2], f"{content_hash}.html.gz")
+
+    def get_entry(self, url):
+        """返回URL的缓存元数据 {url, content_hash, fetched_at, size}，未缓存返回None"""
+        try:
+            with open(self._index_path(url), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get(self, url):
+        """返回缓存的页面HTML，未缓存返回None"""
+        entry = self.get_entry(url)
+        if entry is None:
+            return None
+        try:
+            with gzip.open(self._blob_path(entry["content_hash"]), 'rt', encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, url, html):
+        """保存页面HTML并更新URL索引，返回元数据"""
+        content_hash = sha256(html)
+        blob_path = self._blob_path(content_hash)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            # 先写临时文件再改名，避免中断时留下损坏的缓存
+            tmp_path = f"{blob_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                f.write(html)
+            os.replace(tmp_path, blob_path)
+
+        entry = {
+            "url": url,
+            "content_hash": content_hash,
+            "fetched_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "size": len(html.encode("utf-8")),
+        }
+        index_path = self._index_path(url)
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        tmp_path = f"{index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, index_path)
+        return entry
+
+    def iter_entries(self):
+        """遍历所有缓存的URL元数据"""
+        if not os.path.isdir(self.index_dir):
+            return
+        for dirpath, _, filenames in os.walk(self.index_dir):
+            for filename in filenames:
+                if not filename.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(dirpath, filename), 'r', encoding='utf-8') as f:
+                        yield json.load(f)
+                except (OSError, ValueError):
+                    continue
+
+
+_cache = None
+_replay = False
+
+
+def get_page_cache():
+    global _cache
+    if _cache is None:
+        _cache = PageCache()
+    return _cache
+
+
+def set_replay(enabled=True):
+    """开启回放模式：所有页面只从缓存读取，不访问网络"""
+    global _replay
+    _replay = enabled
+
+
+def is_replay():
+    return _replay
+
+
+def main():
+    # 用法: python page_cache.py  显示缓存统计
+    count = 0
+    total_size = 0
+    blobs = set()
+    for entry in get_page_cache().iter_entries():
+        count += 1
+        total_size += entry.get("size", 0)
+        blobs.add(entry["content_hash"])
+    print(f"缓存URL数: {count}")
+    print(f"不同页面内容数: {len(blobs)}")
+    print(f"原始页面总大小: {total_size / 1024 / 1024:.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
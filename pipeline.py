@@ -0,0 +1,250 @@
+import os
+import sys
+import asyncio
+from urllib.parse import urlparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from fetcher import fetch_html
+from page_cache import set_replay, is_replay, get_page_cache
+from sources import SOURCES, parse_html
+from revision_store import extract_revision_id, record_revision
+from speaker_map import load_speaker_map, normalize_dialogues
+from crawl_manifest import get_manifest, normalize_path, STATUS_FAILED
+from episode_io import write_episode_file, available_formats, DEFAULT_FORMAT
+
+
+# 每个站点同时进行的抓取数量上限，实际的并发由throttle中的自适应限流器决定
+DEFAULT_WORKERS = 8
+# 解析进程数，HTML解析是CPU密集型，放到进程池中才能用上多核
+DEFAULT_PARSE_WORKERS = os.cpu_count() or 2
+# 阶段之间队列的长度，下游处理不过来时上游暂停，内存中最多同时保留这么多个原始页面
+QUEUE_SIZE = 16
+
+class CrawlPipeline:
+    """主线、支线和英文剧情共用的抓取流水线
+
+    每个站点的小节进入各自的任务队列、由各自的一组协程抓取，中英文站点同时下载。
+    抓取 → 解析 → 写入三个阶段各自并发、通过有界队列衔接，前一个小节在解析或写入时，下一个小节已经在下载。
+    解析在独立的进程池中进行，不占用事件循环，也不和网络请求争抢GIL。
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, parse_workers=DEFAULT_PARSE_WORKERS, output_format=DEFAULT_FORMAT,
+                 normalize_speakers=False):
+        self.workers = workers
+        self.parse_workers = parse_workers
+        self.output_format = output_format
+        # 写入前按说话人对照表规范化中文说话人（去掉冒号、补上english_speaker），对照表由speaker_map.py生成
+        self.speaker_map = load_speaker_map() if normalize_speakers else None
+        self.stats = {"total": 0, "skipped": 0, "saved": 0, "failed": 0, "uncached": 0}
+
+    def build_jobs(self, source_names, chapter_filter=None, episode_filter=None, force=False, only_failed=False):
+        """根据故事结构生成抓取任务，已爬取的小节跳过（force时全部重新处理）
+
+        only_failed为True时只生成抓取清单中记录为失败的小节；回放模式下没有缓存的小节不处理，
+        抓取清单和已有的输出文件保持原样
+        """
+        manifest = get_manifest()
+        # 上次中断时正在处理的小节排在最前面，从中断的地方继续
+        interrupted = set(manifest.interrupted())
+        if interrupted:
+            print(f"上次运行中断时有 {len(interrupted)} 个小节未写完，将优先重新抓取")
+        jobs = []
+        for source_name in source_names:
+            source = SOURCES[source_name]
+            for chapter_title, episode_title, link in source.iter_episodes(chapter_filter, episode_filter):
+                self.stats["total"] += 1
+                job = source.make_job(chapter_title, episode_title, link)
+                if only_failed and manifest.status(job["path"]) != STATUS_FAILED:
+                    self.stats["skipped"] += 1
+                    continue
+                if not force and manifest.is_crawled(job["path"]):
+                    self.stats["skipped"] += 1
+                    continue
+                if is_replay() and get_page_cache().get_entry(job["url"]) is None:
+                    self.stats["uncached"] += 1
+                    continue
+                jobs.append(job)
+        jobs.sort(key=lambda job: normalize_path(job["path"]) not in interrupted)
+        return jobs
+
+    def fail(self, job, reason):
+        self.stats["failed"] += 1
+        if is_replay():
+            # 回放只是重新解析已缓存的页面，失败时已有的输出文件没有变化，抓取清单中的记录保持原样
+            print(f"  警告: 未能从 {job['title']} 的缓存页面提取到对话（{reason}），保留原有结果")
+            return
+        print(f"  警告: 未能从 {job['title']} 提取到对话（{reason}），将在下次运行时重试")
+        get_manifest().mark_failed(job["path"], reason, url=job["url"], source=job["source"])
+
+    async def fetch_stage(self, job_queue, parse_queue, fetch_executor):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await job_queue.get()
+            if job is None:
+                return
+            # 每个站点的请求速率和并发由fetcher中的自适应限流器（throttle.HostThrottle）决定
+            print(f"  处理小节: {job['title']} ({job['url']})")
+            if not is_replay():
+                get_manifest().mark_started(job["path"], url=job["url"], source=job["source"])
+            try:
+                # requests是同步的，放到线程中执行，避免阻塞事件循环；每个抓取协程各占一个线程，
+                # 等在限流器上的线程不会占满默认线程池，让其他站点的请求发不出去
+                html = await loop.run_in_executor(fetch_executor, fetch_html, job["url"])
+            except Exception as e:
+                self.fail(job, e)
+                continue
+            if html is None:
+                self.fail(job, "未获取到页面")
+                continue
+            await parse_queue.put((job, html))
+
+    async def parse_stage(self, parse_queue, write_queue, executor):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await parse_queue.get()
+            if item is None:
+                return
+            job, html = item
+            try:
+                # 每个解析协程同时只交给进程池一个页面，进程池不会积压任务
+                dialogues = await loop.run_in_executor(executor, parse_html, job["source"], html)
+            except Exception as e:
+                self.fail(job, e)
+                continue
+            if not dialogues:
+                self.fail(job, "未提取到对话")
+                continue
+            await write_queue.put((job, dialogues, extract_revision_id(html) or job.get("revid")))
+
+    def write_episode(self, job, dialogues, revid):
+        # 只有中文数据源的对话有speaker字段
+        if self.speaker_map is not None and "speaker" in dialogues[0]:
+            dialogues = normalize_dialogues(dialogues, self.speaker_map)
+        # job["path"]是 <小节>.json 键，实际文件的后缀由输出格式决定
+        write_episode_file(job["path"], dialogues, self.output_format)
+        get_manifest().mark_done(job["path"], dialogues, url=job["url"], source=job["source"])
+        # 记录页面修订号，供增量刷新判断页面是否被编辑过
+        if revid:
+            record_revision(job["source"], job["link"], revid, job.get("timestamp"))
+
+    async def write_stage(self, write_queue):
+        while True:
+            item = await write_queue.get()
+            if item is None:
+                return
+            job, dialogues, revid = item
+            try:
+                await asyncio.to_thread(self.write_episode, job, dialogues, revid)
+            except Exception as e:
+                self.fail(job, e)
+                continue
+            self.stats["saved"] += 1
+            print(f"  {job['title']}: 成功提取 {len(dialogues)} 条对话")
+
+    async def run(self, source_names, chapter_filter=None, episode_filter=None, force=False, only_failed=False):
+        jobs = self.build_jobs(source_names, chapter_filter, episode_filter, force, only_failed)
+        print(f"共 {self.stats['total']} 个小节，跳过 {self.stats['skipped']} 个，待抓取 {len(jobs)} 个")
+        if self.stats["uncached"]:
+            print(f"回放模式下有 {self.stats['uncached']} 个小节没有缓存的页面，保留原有结果")
+        return await self.run_jobs(jobs)
+
+    async def run_jobs(self, jobs):
+        """按流水线执行给定的抓取任务"""
+        # 按站点分队列：同一个队列里的协程会全部等在一个站点的限流器上，让其他站点闲着
+        job_queues = {}
+        for job in jobs:
+            job_queues.setdefault(urlparse(job["url"]).netloc, asyncio.Queue()).put_nowait(job)
+        for job_queue in job_queues.values():
+            for _ in range(self.workers):
+                job_queue.put_nowait(None)
+        parse_queue = asyncio.Queue(QUEUE_SIZE)
+        write_queue = asyncio.Queue(QUEUE_SIZE)
+
+        fetch_count = len(job_queues) * self.workers
+        with ProcessPoolExecutor(max_workers=self.parse_workers) as executor, \
+                ThreadPoolExecutor(max_workers=max(1, fetch_count)) as fetch_executor:
+            fetchers = [
+                asyncio.create_task(self.fetch_stage(job_queue, parse_queue, fetch_executor))
+                for job_queue in job_queues.values() for _ in range(self.workers)
+            ]
+            parsers = [asyncio.create_task(self.parse_stage(parse_queue, write_queue, executor)) for _ in range(self.parse_workers)]
+            writer = asyncio.create_task(self.write_stage(write_queue))
+
+            # 上游全部结束后再通知下游结束
+            await asyncio.gather(*fetchers)
+            for _ in parsers:
+                await parse_queue.put(None)
+            await asyncio.gather(*parsers)
+            await write_queue.put(None)
+            await writer
+        return self.stats
+
+
+def run_pipeline(source_names, chapter_filter=None, episode_filter=None, workers=DEFAULT_WORKERS,
+                 parse_workers=DEFAULT_PARSE_WORKERS, force=False, only_failed=False, output_format=DEFAULT_FORMAT,
+                 normalize_speakers=False):
+    pipeline = CrawlPipeline(workers=workers, parse_workers=parse_workers, output_format=output_format,
+                             normalize_speakers=normalize_speakers)
+    return asyncio.run(pipeline.run(source_names, chapter_filter, episode_filter, force, only_failed))
+
+
+def print_stats(stats):
+    print("\n爬取统计:")
+    print(f"总小节数: {stats['total']}")
+    print(f"已爬取小节数: {stats['skipped']}")
+    print(f"新爬取小节数: {stats['saved']}")
+    print(f"失败小节数: {stats['failed']}")
+    if stats.get("uncached"):
+        print(f"回放时没有缓存的小节数: {stats['uncached']}")
+    if stats["total"]:
+        print(f"完成率: {((stats['skipped'] + stats['saved']) / stats['total']) * 100:.2f}%")
+
+
+def main(argv=None, default_sources=None):
+    # 用法: python pipeline.py [cn_main cn_side en_side] [--workers N] [--parse-workers N]
+    #                          [--chapter 章节标题] [--episode 小节标题] [--replay] [--retry-failed]
+    #                          [--format json|jsonl|gzip|zstd] [--normalize-speakers]
+    # --replay: 从本地页面缓存重新解析所有小节并覆盖输出，不访问网络
+    # --retry-failed: 只重试抓取清单中记录为失败的小节
+    # --format: 小节的保存格式，默认json；jsonl逐条写入，gzip/zstd为压缩的JSONL（zstd需要安装zstandard）
+    # --normalize-speakers: 按output/speaker_map.json规范化中文说话人，去掉冒号并补上english_speaker
+    args = list(sys.argv[1:] if argv is None else argv)
+    replay = "--replay" in args
+    if replay:
+        args.remove("--replay")
+        set_replay()
+    only_failed = "--retry-failed" in args
+    if only_failed:
+        args.remove("--retry-failed")
+    normalize_speakers = "--normalize-speakers" in args
+    if normalize_speakers:
+        args.remove("--normalize-speakers")
+    options = {"--workers": DEFAULT_WORKERS, "--parse-workers": DEFAULT_PARSE_WORKERS, "--chapter": None, "--episode": None,
+               "--format": DEFAULT_FORMAT}
+    for option in options:
+        if option in args:
+            index = args.index(option)
+            options[option] = args[index + 1]
+            del args[index:index + 2]
+
+    if options["--format"] not in available_formats():
+        print(f"不支持的输出格式: {options['--format']}，可选: {', '.join(available_formats())}")
+        return
+
+    source_names = args or default_sources or list(SOURCES)
+    stats = run_pipeline(
+        source_names,
+        chapter_filter=options["--chapter"],
+        episode_filter=options["--episode"],
+        workers=int(options["--workers"]),
+        parse_workers=int(options["--parse-workers"]),
+        force=replay,
+        only_failed=only_failed,
+        output_format=options["--format"],
+        normalize_speakers=normalize_speakers,
+    )
+    print_stats(stats)
+    print("\n抓取完成！所有对话已保存")
+
+
+if __name__ == "__main__":
+    main()
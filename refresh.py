@@ -0,0 +1,99 @@
+import sys
+import asyncio
+from pipeline import CrawlPipeline, DEFAULT_WORKERS
+from sources import SOURCES
+from mediawiki_api import link_to_title, query_revisions
+from revision_store import load_revisions, record_revisions
+from episode_io import resolve_episode_path, DEFAULT_FORMAT
+
+
+def find_changed_episodes(source_name, chapter_filter=None, revisions=None):
+    """批量查询wiki上的最新修订号，返回修订号与记录不一致的小节
+
+    返回 (需要重新抓取的任务列表, 已有输出文件但没有修订记录的小节的任务列表)
+    """
+    source = SOURCES[source_name]
+    if revisions is None:
+        revisions = load_revisions()
+    known = revisions.get(source_name, {})
+
+    episodes = list(source.iter_episodes(chapter_filter))
+    current = query_revisions(source.base_url, [link_to_title(link) for _, _, link in episodes])
+
+    changed = []
+    untracked = []
+    for chapter_title, episode_title, link in episodes:
+        info = current.get(link_to_title(link))
+        if info is None:
+            # wiki上没有这个页面，刷新时无法处理
+            continue
+        job = source.make_job(chapter_title, episode_title, link)
+        job["revid"] = info["revid"]
+        job["timestamp"] = info["timestamp"]
+        recorded = known.get(link)
+        if recorded and recorded.get("revid") == info["revid"] and resolve_episode_path(job["path"]) is not None:
+            continue
+        if recorded is None and resolve_episode_path(job["path"]) is not None:
+            untracked.append(job)
+        else:
+            changed.append(job)
+    return changed, untracked
+
+
+def refresh(source_names, chapter_filter=None, baseline=False, workers=DEFAULT_WORKERS, output_format=DEFAULT_FORMAT):
+    """增量刷新：只重新抓取在wiki上被编辑过的小节
+
+    baseline为True时，把已有输出但没有记录修订号的小节直接记为当前修订号；
+    否则这些小节也会重新抓取一次，以确认内容是最新的。
+    """
+    revisions = load_revisions()
+    jobs = []
+    for source_name in source_names:
+        changed, untracked = find_changed_episodes(source_name, chapter_filter, revisions)
+        print(f"{source_name}: {len(changed)} 个小节有更新，{len(untracked)} 个小节没有修订记录")
+        jobs.extend(changed)
+        if not untracked:
+            continue
+        if baseline:
+            record_revisions(source_name, {job["link"]: {"revid": job["revid"], "timestamp": job["timestamp"]} for job in untracked})
+        else:
+            jobs.extend(untracked)
+
+    if not jobs:
+        print("所有小节都是最新的")
+        return {"total": 0, "skipped": 0, "saved": 0, "failed": 0}
+
+    pipeline = CrawlPipeline(workers=workers, output_format=output_format)
+    return asyncio.run(pipeline.run_jobs(jobs))
+
+
+def main():
+    # 用法: python refresh.py [cn_main cn_side en_side] [--chapter 章节标题] [--baseline] [--workers N]
+    #                         [--format json|jsonl|gzip|zstd]
+    # --baseline: 第一次使用时把现有输出记为最新，不重新抓取
+    args = sys.argv[1:]
+    baseline = "--baseline" in args
+    if baseline:
+        args.remove("--baseline")
+    workers = DEFAULT_WORKERS
+    chapter_filter = None
+    if "--workers" in args:
+        index = args.index("--workers")
+        workers = int(args[index + 1])
+        del args[index:index + 2]
+    if "--chapter" in args:
+        index = args.index("--chapter")
+        chapter_filter = args[index + 1]
+        del args[index:index + 2]
+    output_format = DEFAULT_FORMAT
+    if "--format" in args:
+        index = args.index("--format")
+        output_format = args[index + 1]
+        del args[index:index + 2]
+
+    stats = refresh(args or list(SOURCES), chapter_filter, baseline, workers, output_format)
+    print(f"\n重新抓取 {stats['saved']} 个小节，失败 {stats['failed']} 个")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import os
+import re
+import json
+import threading
+
+
+OUTPUT_DIR = "output"
+REVISIONS_PATH = os.path.join(OUTPUT_DIR, "revisions.json")
+
+# MediaWiki页面的mw.config中带有当前修订号
+REVISION_ID_PATTERN = re.compile(r'"wgRevisionId":\s*(\d+)')
+
+_lock = threading.Lock()
+
+
+def extract_revision_id(html):
+    """从完整的wiki页面HTML中取出修订号，找不到返回None"""
+    match = REVISION_ID_PATTERN.search(html)
+    if match and match.group(1) != "0":
+        return int(match.group(1))
+    return None
+
+
+def load_revisions(path=REVISIONS_PATH):
+    """加载已记录的修订号 {数据源: {页面链接: {"revid", "timestamp"}}}"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_revisions(revisions, path=REVISIONS_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(revisions, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def record_revision(source_name, link, revid, timestamp=None, path=REVISIONS_PATH):
+    """记录某个小节页面被抓取时的修订号"""
+    with _lock:
+        revisions = load_revisions(path)
+        revisions.setdefault(source_name, {})[link] = {"revid": revid, "timestamp": timestamp}
+        save_revisions(revisions, path)
+
+
+def record_revisions(source_name, entries, path=REVISIONS_PATH):
+    """批量记录修订号，entries为 {页面链接: {"revid", "timestamp"}}"""
+    with _lock:
+        revisions = load_revisions(path)
+        revisions.setdefault(source_name, {}).update(entries)
+        save_revisions(revisions, path)
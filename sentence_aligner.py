@@ -0,0 +1,239 @@
+import numpy as np
+from speaker_map import normalize_chinese_speaker
+
+
+# Gale–Church式长度对齐的参数
+# 英文字符数约为中文的3.37倍，方差系数17，均由NS朔日手记中逐行对应的2851条对话估计
+DEFAULT_LENGTH_RATIO = 3.37
+LENGTH_VARIANCE = 17.0
+
+# 各种对齐方式（中文行数:英文行数）的先验概率，沿用Gale–Church论文中的取值
+BEAD_PRIORS = {
+    "1:1": 0.89,
+    "1:0": 0.0099 / 2,
+    "0:1": 0.0099 / 2,
+    "2:1": 0.089 / 2,
+    "1:2": 0.089 / 2,
+}
+BEAD_TYPES = list(BEAD_PRIORS)
+BEAD_COSTS = {bead: -np.log(prior) for bead, prior in BEAD_PRIORS.items()}
+
+# 说话人不一致时的惩罚（负对数概率），旁白对旁白、角色对角色视为一致
+SPEAKER_MISMATCH = 3.0
+# 说话人对照表中有的名字作为硬锚点，名字对不上时惩罚更重
+SPEAKER_ANCHOR_MISMATCH = 8.0
+
+CN_NARRATOR = "旁白"
+EN_NARRATOR = "Narrator"
+
+# 长度概率的下限，避免取对数时出现无穷大
+MIN_PROBABILITY = 1e-12
+
+
+def _two_tailed_probability(z):
+    """标准正态分布的双尾概率 2 * (1 - Φ(|z|))
+
+    用Abramowitz–Stegun 7.1.26的多项式近似erfc，避免依赖scipy，可以直接对数组计算
+    """
+    x = np.abs(z) / np.sqrt(2)
+    t = 1 / (1 + 0.3275911 * x)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    return poly * np.exp(-x * x)
+
+
+def length_cost(cn_lengths, en_lengths, ratio):
+    """长度匹配的代价：-log P(英文长度 | 中文长度)，参数可以是任意形状的数组"""
+    cn_lengths = np.asarray(cn_lengths, dtype=float)
+    en_lengths = np.asarray(en_lengths, dtype=float)
+    mean = np.maximum((cn_lengths + en_lengths / ratio) / 2, 1.0)
+    z = (en_lengths - cn_lengths * ratio) / np.sqrt(mean * LENGTH_VARIANCE)
+    return -np.log(np.maximum(_two_tailed_probability(z), MIN_PROBABILITY))
+
+
+def episode_length_ratio(cn_lengths, en_lengths):
+    """本小节英文与中文的总字符数之比，有一边为空时用默认值"""
+    if cn_lengths.sum() and en_lengths.sum():
+        return en_lengths.sum() / cn_lengths.sum()
+    return DEFAULT_LENGTH_RATIO
+
+
+def speaker_cost_matrix(cn_speakers, en_speakers, speaker_map=None):
+    """中文第i行与英文第j行说话人的不一致代价，返回 (中文行数, 英文行数) 的矩阵
+
+    speaker_map是 {中文说话人: 英文说话人} 的对照表，表中有的说话人按名字比较，
+    其余只比较是否都是旁白。
+    """
+    cn_names = [normalize_chinese_speaker(s) for s in cn_speakers]
+    cn_narrator = np.array([name == CN_NARRATOR for name in cn_names])
+    en_narrator = np.array([s == EN_NARRATOR for s in en_speakers])
+    costs = (cn_narrator[:, None] != en_narrator[None, :]) * SPEAKER_MISMATCH
+
+    if speaker_map:
+        expected = np.array([speaker_map.get(name, "") for name in cn_names], dtype=object)
+        known = expected != ""
+        if known.any():
+            en_names = np.array([s.strip() for s in en_speakers], dtype=object)
+            named_mismatch = expected[:, None] != en_names[None, :]
+            costs = np.where(known[:, None], named_mismatch * SPEAKER_ANCHOR_MISMATCH, costs)
+    return costs
+
+
+def narrators_match(chinese_dialogues, english_dialogues):
+    """逐行比较两边是否同为旁白或同为角色台词"""
+    return all(
+        (normalize_chinese_speaker(cn["speaker"]) == CN_NARRATOR) == (en["english_speaker"] == EN_NARRATOR)
+        for cn, en in zip(chinese_dialogues, english_dialogues)
+    )
+
+
+def _bead_cost_matrices(cn_lengths, en_lengths, speaker_costs, ratio):
+    """按对齐块的结束位置 (i, j) 计算各种对齐方式的代价矩阵，非法位置为inf"""
+    n, m = len(cn_lengths), len(en_lengths)
+    shape = (n + 1, m + 1)
+    costs = {bead: np.full(shape, np.inf) for bead in ("1:1", "2:1", "1:2")}
+
+    if n and m:
+        costs["1:1"][1:, 1:] = (
+            length_cost(cn_lengths[:, None], en_lengths[None, :], ratio) + speaker_costs + BEAD_COSTS["1:1"]
+        )
+    if n >= 2 and m:
+        cn_pairs = cn_lengths[:-1] + cn_lengths[1:]
+        pair_speakers = (speaker_costs[:-1] + speaker_costs[1:]) / 2
+        costs["2:1"][2:, 1:] = (
+            length_cost(cn_pairs[:, None], en_lengths[None, :], ratio) + pair_speakers + BEAD_COSTS["2:1"]
+        )
+    if n and m >= 2:
+        en_pairs = en_lengths[:-1] + en_lengths[1:]
+        pair_speakers = (speaker_costs[:, :-1] + speaker_costs[:, 1:]) / 2
+        costs["1:2"][1:, 2:] = (
+            length_cost(cn_lengths[:, None], en_pairs[None, :], ratio) + pair_speakers + BEAD_COSTS["1:2"]
+        )
+    return costs
+
+
+# 每种对齐方式结束在 (i, j) 时的起点偏移
+BEAD_STEPS = {"1:1": (1, 1), "1:0": (1, 0), "0:1": (0, 1), "2:1": (2, 1), "1:2": (1, 2)}
+
+
+def fill_alignment_dp(cn_lengths, en_lengths, speaker_costs=None, ratio=None):
+    """填充DP矩阵，返回 (累计代价total, 回溯表back, 各对齐方式在每个格子的候选代价candidates)
+
+    total在左上各多留两行两列inf（格子 (i, j) 对应 total[i + 2, j + 2]），起点越界时直接取到inf；
+    candidates[b, i, j] 是以对齐方式b结束在 (i, j) 时的累计代价。
+    DP矩阵按反对角线 i + j = k 逐条计算，每条反对角线上的所有格子只依赖前三条，
+    可以整条用NumPy向量化。
+    """
+    cn_lengths = np.asarray(cn_lengths, dtype=float)
+    en_lengths = np.asarray(en_lengths, dtype=float)
+    n, m = len(cn_lengths), len(en_lengths)
+    if ratio is None:
+        ratio = episode_length_ratio(cn_lengths, en_lengths)
+    if speaker_costs is None:
+        speaker_costs = np.zeros((n, m))
+
+    costs = _bead_cost_matrices(cn_lengths, en_lengths, speaker_costs, ratio)
+    total = np.full((n + 3, m + 3), np.inf)
+    total[2, 2] = 0.0
+    back = np.full((n + 1, m + 1), -1, dtype=np.int8)
+    candidates_by_cell = np.full((len(BEAD_TYPES), n + 1, m + 1), np.inf)
+
+    for k in range(1, n + m + 1):
+        i = np.arange(max(0, k - m), min(n, k) + 1)
+        j = k - i
+        candidates = np.empty((len(BEAD_TYPES), len(i)))
+        for index, bead in enumerate(BEAD_TYPES):
+            di, dj = BEAD_STEPS[bead]
+            if bead in costs:
+                bead_cost = costs[bead][i, j]
+            else:
+                # 1:0 和 0:1 的代价与长度无关
+                valid = (i >= di) & (j >= dj)
+                bead_cost = np.where(valid, BEAD_COSTS[bead], np.inf)
+            candidates[index] = total[i + 2 - di, j + 2 - dj] + bead_cost
+        best = candidates.argmin(axis=0)
+        total[i + 2, j + 2] = candidates[best, np.arange(len(i))]
+        back[i, j] = best
+        candidates_by_cell[:, i, j] = candidates
+    return total, back, candidates_by_cell
+
+
+def bead_posterior(candidates_by_cell, bead, i, j):
+    """对齐方式bead结束在 (i, j) 的后验概率：与同一格子上其他对齐方式的候选代价归一化
+
+    代价是负对数概率，所以后验为 exp(-c_bead) / Σ exp(-c_b)。
+    """
+    candidates = candidates_by_cell[:, i, j]
+    best = candidates.min()
+    if not np.isfinite(best):
+        return 0.0
+    weights = np.exp(-(candidates - best))
+    return float(weights[BEAD_TYPES.index(bead)] / weights.sum())
+
+
+def align_lengths(cn_lengths, en_lengths, speaker_costs=None, ratio=None):
+    """动态规划求代价最小的对齐，返回 [(对齐方式, 中文行号列表, 英文行号列表, 代价, 后验概率), ...]"""
+    n, m = len(cn_lengths), len(en_lengths)
+    total, back, candidates_by_cell = fill_alignment_dp(cn_lengths, en_lengths, speaker_costs, ratio)
+
+    beads = []
+    i, j = n, m
+    while i > 0 or j > 0:
+        bead = BEAD_TYPES[back[i, j]]
+        di, dj = BEAD_STEPS[bead]
+        cost = total[i + 2, j + 2] - total[i + 2 - di, j + 2 - dj]
+        posterior = bead_posterior(candidates_by_cell, bead, i, j)
+        beads.append((bead, list(range(i - di, i)), list(range(j - dj, j)), cost, posterior))
+        i, j = i - di, j - dj
+    beads.reverse()
+    return beads
+
+
+def _join_speakers(speakers):
+    unique = list(dict.fromkeys(speakers))
+    return " / ".join(unique)
+
+
+def align_episode(chinese_dialogues, english_dialogues, speaker_map=None):
+    """对齐一个小节的中英文对话，返回带置信度的对齐结果列表
+
+    置信度是这一对齐块的后验概率：在它结束的格子上，与其他对齐方式（1:1、2:1、1:0等）
+    的候选代价归一化，取值0~1；只有一边有内容的行（1:0 或 0:1）置信度为0。
+    """
+    cn_lengths = np.array([len(d["dialogue"]) for d in chinese_dialogues], dtype=float)
+    en_lengths = np.array([len(d["english_dialogue"]) for d in english_dialogues], dtype=float)
+    speaker_costs = speaker_cost_matrix(
+        [d["speaker"] for d in chinese_dialogues],
+        [d["english_speaker"] for d in english_dialogues],
+        speaker_map,
+    ) if len(cn_lengths) and len(en_lengths) else None
+
+    if len(cn_lengths) == len(en_lengths) and narrators_match(chinese_dialogues, english_dialogues):
+        # 行数相同且每一行的旁白/角色都对得上时，逐行对应就是正确结果，不再做DP
+        # （这里不用说话人对照表，译文中偶尔会把台词归给另一个角色）
+        # 置信度仍按DP各格子的候选代价计算，说话人同样只比较旁白/角色
+        narrator_costs = speaker_cost_matrix(
+            [d["speaker"] for d in chinese_dialogues],
+            [d["english_speaker"] for d in english_dialogues],
+        ) if len(cn_lengths) else None
+        _, _, candidates_by_cell = fill_alignment_dp(cn_lengths, en_lengths, narrator_costs)
+        beads = [
+            ("1:1", [i], [i], None, bead_posterior(candidates_by_cell, "1:1", i + 1, i + 1))
+            for i in range(len(cn_lengths))
+        ]
+    else:
+        beads = align_lengths(cn_lengths, en_lengths, speaker_costs)
+
+    aligned = []
+    for bead, cn_rows, en_rows, _, posterior in beads:
+        cn_lines = [chinese_dialogues[i] for i in cn_rows]
+        en_lines = [english_dialogues[j] for j in en_rows]
+        confidence = posterior if cn_lines and en_lines else 0.0
+        aligned.append({
+            "chinese_speaker": _join_speakers([d["speaker"] for d in cn_lines]),
+            "chinese_text": "\n".join(d["dialogue"] for d in cn_lines),
+            "english_speaker": _join_speakers([d["english_speaker"] for d in en_lines]),
+            "english_text": "\n".join(d["english_dialogue"] for d in en_lines),
+            "alignment": bead,
+            "confidence": round(confidence, 4),
+        })
+    return aligned
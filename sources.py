@@ -0,0 +1,99 @@
+import os
+import json_backend
+from story_parser import parse_chinese_html_fast, parse_english_html_fast
+
+
+OUTPUT_DIR = "output"
+
+CN_BASE_URL = "https://res1999.huijiwiki.com"
+EN_BASE_URL = "https://reverse1999.fandom.com"
+
+
+class SourceAdapter:
+    """一种剧情数据源：从哪个结构文件读小节、去哪个站点抓、用什么解析、存到哪里
+
+    parse接收页面HTML字符串，返回对话列表
+    """
+
+    def __init__(self, name, base_url, structure, section, title_key, output_dir, parse):
+        self.name = name
+        self.base_url = base_url
+        self.structure = structure
+        self.section = section
+        self.title_key = title_key
+        self.output_dir = output_dir
+        self.parse = parse
+
+    def load_structure(self):
+        structure_path = os.path.join(OUTPUT_DIR, self.structure)
+        try:
+            return json_backend.load_path(structure_path)
+        except Exception as e:
+            print(f"加载故事结构数据失败: {e}")
+            return None
+
+    def iter_episodes(self, chapter_filter=None, episode_filter=None):
+        """遍历结构文件中的小节，返回 (章节目录名, 小节标题, 页面链接)"""
+        structure = self.load_structure()
+        if not structure:
+            return
+        for chapter in structure[self.section]:
+            chapter_title = chapter[self.title_key]
+            if chapter_filter and chapter_title != chapter_filter:
+                continue
+            for episode in chapter["episodes"]:
+                episode_title = episode[self.title_key]
+                if episode_filter and episode_title != episode_filter:
+                    continue
+                yield chapter_title, episode_title, episode["link"]
+
+    def url(self, link):
+        return f"{self.base_url}{link}"
+
+    def episode_path(self, chapter_title, episode_title):
+        return os.path.join(self.output_dir, chapter_title, f"{episode_title}.json")
+
+    def make_job(self, chapter_title, episode_title, link):
+        return {
+            "source": self.name,
+            "link": link,
+            "url": self.url(link),
+            "title": episode_title,
+            "path": self.episode_path(chapter_title, episode_title),
+        }
+
+
+SOURCES = {
+    "cn_main": SourceAdapter(
+        name="cn_main",
+        base_url=CN_BASE_URL,
+        structure="story_structure.json",
+        section="main_story",
+        title_key="chinese_title",
+        output_dir=os.path.join(OUTPUT_DIR, "dialogues"),
+        parse=parse_chinese_html_fast,
+    ),
+    "cn_side": SourceAdapter(
+        name="cn_side",
+        base_url=CN_BASE_URL,
+        structure="side_story_structure.json",
+        section="side_story",
+        title_key="chinese_title",
+        output_dir=os.path.join(OUTPUT_DIR, "side_dialogues"),
+        parse=parse_chinese_html_fast,
+    ),
+    "en_side": SourceAdapter(
+        name="en_side",
+        base_url=EN_BASE_URL,
+        structure="fandom_story_structure_en.json",
+        section="side_story",
+        title_key="english_title",
+        output_dir=OUTPUT_DIR,
+        parse=parse_english_html_fast,
+    ),
+}
+
+
+def parse_html(source_name, html):
+    """用数据源对应的解析函数解析页面HTML（模块级函数，可以交给进程池执行）"""
+    return SOURCES[source_name].parse(html)
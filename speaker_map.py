@@ -0,0 +1,114 @@
+import os
+import glob
+import json
+import hashlib
+import json_backend
+from collections import Counter, defaultdict
+from story_index import ALIGNED_DIR, OUTPUT_DIR
+
+
+SPEAKER_MAP_PATH = os.path.join(OUTPUT_DIR, "speaker_map.json")
+
+# 一个中文说话人对应到某个英文名的行数占比至少为该值才收录
+MIN_SHARE = 0.6
+MIN_COUNT = 1
+
+# 不需要学习的固定对应
+FIXED_PAIRS = {"旁白": "Narrator"}
+
+
+def normalize_chinese_speaker(speaker):
+    """去掉中文说话人末尾的冒号，如"贵族女性：" → "贵族女性" """
+    return speaker.strip().rstrip("：:").strip()
+
+
+def iter_aligned_pairs(aligned_dir=ALIGNED_DIR):
+    """遍历已对齐小节中逐行对应的 (中文说话人, 英文说话人)"""
+    for path in glob.glob(os.path.join(aligned_dir, "**", "*.json"), recursive=True):
+        for item in json_backend.load_path(path):
+            # 合并或缺失的行中说话人可能不止一个，不参与统计
+            if item.get("alignment", "1:1") != "1:1":
+                continue
+            cn_speaker = normalize_chinese_speaker(item["chinese_speaker"])
+            en_speaker = item["english_speaker"].strip()
+            if cn_speaker and en_speaker:
+                yield cn_speaker, en_speaker
+
+
+def learn_speaker_map(aligned_dir=ALIGNED_DIR, min_share=MIN_SHARE, min_count=MIN_COUNT):
+    """根据共现次数学习中英文说话人对照，返回 [[中文, 英文, 共现行数, 中文说话人总行数], ...]
+
+    每个中文说话人取共现最多的英文名，占比不够的（同一个中文名对应多种译名）不收录。
+    """
+    cooccurrence = defaultdict(Counter)
+    for cn_speaker, en_speaker in iter_aligned_pairs(aligned_dir):
+        cooccurrence[cn_speaker][en_speaker] += 1
+
+    table = []
+    for cn_speaker, counts in cooccurrence.items():
+        total = sum(counts.values())
+        en_speaker, count = counts.most_common(1)[0]
+        if cn_speaker in FIXED_PAIRS:
+            en_speaker, count = FIXED_PAIRS[cn_speaker], counts[FIXED_PAIRS[cn_speaker]]
+        elif count < min_count or count / total < min_share:
+            continue
+        table.append([cn_speaker, en_speaker, count, total])
+    for cn_speaker, en_speaker in FIXED_PAIRS.items():
+        if cn_speaker not in cooccurrence:
+            table.append([cn_speaker, en_speaker, 0, 0])
+    table.sort(key=lambda row: (-row[3], row[0]))
+    return table
+
+
+def save_speaker_map(table, path=SPEAKER_MAP_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        # 每个说话人一行 [中文, 英文, 共现行数, 总行数]，文件紧凑也便于比较差异
+        f.write('{"columns": ["chinese", "english", "count", "total"], "speakers": [\n')
+        f.write(",\n".join(json.dumps(row, ensure_ascii=False) for row in table))
+        f.write("\n]}\n")
+    os.replace(tmp_path, path)
+
+
+def load_speaker_map(path=SPEAKER_MAP_PATH):
+    """加载对照表，返回 {中文说话人(无冒号): 英文说话人}；文件不存在时只有固定对应"""
+    try:
+        table = json_backend.load_path(path)["speakers"]
+    except (OSError, ValueError, KeyError):
+        return dict(FIXED_PAIRS)
+    return {row[0]: row[1] for row in table}
+
+
+def speaker_map_hash(speaker_map):
+    data = json.dumps(speaker_map, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def normalize_dialogues(dialogues, speaker_map=None):
+    """提取结果的说话人规范化：去掉中文说话人的冒号，并按对照表补上英文说话人
+
+    返回新的列表，不修改传入的对话；对照表中没有的说话人english_speaker为None
+    """
+    normalized = []
+    for item in dialogues:
+        speaker = normalize_chinese_speaker(item["speaker"])
+        entry = dict(item, speaker=speaker)
+        if speaker_map is not None:
+            entry["english_speaker"] = speaker_map.get(speaker)
+        normalized.append(entry)
+    return normalized
+
+
+def main():
+    # 用法: python speaker_map.py
+    # 从output/en_side_dialogues中已对齐的小节学习说话人对照，保存到output/speaker_map.json
+    table = learn_speaker_map()
+    save_speaker_map(table)
+    print(f"共 {len(table)} 个说话人，对照表已保存到 {SPEAKER_MAP_PATH}")
+    for cn_speaker, en_speaker, count, total in table[:10]:
+        print(f"  {cn_speaker} → {en_speaker}（{count}/{total}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import os
+import re
+import json_backend
+from urllib.parse import unquote
+from sources import SOURCES, OUTPUT_DIR
+from episode_io import atomic_write
+
+
+INDEX_PATH = os.path.join(OUTPUT_DIR, "story_index.json")
+ALIGNED_DIR = os.path.join(OUTPUT_DIR, "en_side_dialogues")
+
+# 中文结构文件对应的数据源，以及小节属于主线还是支线
+CN_SOURCES = (("cn_main", "main"), ("cn_side", "side"))
+EN_SOURCE = "en_side"
+
+EPISODE_ID_PATTERN = re.compile(r"^(.+?)-0*(\d+)$")
+
+
+def canonical_episode_id(link):
+    """把两个wiki的页面链接统一成小节ID
+
+    /wiki/NS-01、/wiki/NS-1、/wiki/NS-5/Story 分别得到 NS-01、NS-01、NS-05，
+    /wiki/%E5%BA%8F%E7%AB%A0-01 得到 序章-01
+    """
+    page = unquote(link)
+    if page.startswith("/wiki/"):
+        page = page[len("/wiki/"):]
+    page = page.split("/")[0].strip()
+    match = EPISODE_ID_PATTERN.match(page)
+    if not match:
+        return page
+    prefix, number = match.groups()
+    return f"{prefix}-{int(number):02d}"
+
+
+def aligned_path(english_chapter, episode_id, chinese_title):
+    """中英对齐结果的保存位置：en_side_dialogues/<英文章节>/<小节ID> <中文标题>.json"""
+    return os.path.join(ALIGNED_DIR, english_chapter, f"{episode_id} {chinese_title}.json")
+
+
+def build_story_index():
+    """合并中文主线、支线和英文支线的结构文件，返回 {小节ID: 小节信息}"""
+    index = {}
+    for source_name, kind in CN_SOURCES:
+        source = SOURCES[source_name]
+        structure = source.load_structure() or {}
+        for chapter in structure.get(source.section, []):
+            chapter_title = chapter["chinese_title"]
+            for episode in chapter["episodes"]:
+                episode_title = episode["chinese_title"]
+                link = episode["link"]
+                episode_id = canonical_episode_id(link)
+                if episode_id in index:
+                    print(f"警告: 小节ID {episode_id} 重复，跳过 {chapter_title} / {episode_title}")
+                    continue
+                index[episode_id] = {
+                    "id": episode_id,
+                    "kind": kind,
+                    "chinese_chapter": chapter_title,
+                    "chinese_title": episode_title,
+                    "english_chapter": None,
+                    "english_title": episode.get("english_title") or None,
+                    "cn_source": source_name,
+                    "cn_link": link,
+                    "cn_url": source.url(link),
+                    "cn_path": source.episode_path(chapter_title, episode_title),
+                    "en_source": None,
+                    "en_link": None,
+                    "en_url": None,
+                    "en_path": None,
+                    "aligned_path": None,
+                }
+
+    en_source = SOURCES[EN_SOURCE]
+    for chapter_title, episode_title, link in en_source.iter_episodes():
+        episode_id = canonical_episode_id(link)
+        entry = index.get(episode_id)
+        if entry is None:
+            print(f"警告: 英文小节 {chapter_title} / {episode_title} 没有对应的中文小节")
+            continue
+        entry.update({
+            "english_chapter": chapter_title,
+            "en_source": EN_SOURCE,
+            "en_link": link,
+            "en_url": en_source.url(link),
+            "en_path": en_source.episode_path(chapter_title, episode_title),
+            "aligned_path": aligned_path(chapter_title, episode_id, entry["chinese_title"]),
+        })
+    return index
+
+
+def save_story_index(index, path=INDEX_PATH):
+    with atomic_write(path, 'wb') as f:
+        json_backend.dump({"episodes": index}, f, indent=True)
+    print(f"小节索引已保存到 {path}")
+
+
+def load_story_index(path=INDEX_PATH):
+    """加载小节索引，返回 {小节ID: 小节信息}；索引文件不存在时现场生成"""
+    if not os.path.exists(path):
+        index = build_story_index()
+        save_story_index(index, path)
+        return index
+    return json_backend.load_path(path)["episodes"]
+
+
+def iter_bilingual_episodes(index, chinese_chapter=None):
+    """遍历中英文都有页面的小节"""
+    for entry in index.values():
+        if not entry["en_path"]:
+            continue
+        if chinese_chapter and entry["chinese_chapter"] != chinese_chapter:
+            continue
+        yield entry
+
+
+def main():
+    # 用法: python story_index.py
+    # 结构文件（story_structure.json等）更新后重新运行，生成output/story_index.json
+    index = build_story_index()
+    save_story_index(index)
+    counts = {}
+    for entry in index.values():
+        counts[entry["kind"]] = counts.get(entry["kind"], 0) + 1
+    bilingual = sum(1 for _ in iter_bilingual_episodes(index))
+    print(f"主线小节: {counts.get('main', 0)}，支线小节: {counts.get('side', 0)}，有英文页面的小节: {bilingual}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+from bs4 import BeautifulSoup
+import lxml.html
+from lxml import etree
+
+
+def parse_chinese_dialogue(soup):
+    """从灰机wiki页面（BeautifulSoup对象）中解析中文对话"""
+    # 找到所有story-text元素，这些元素包含对话内容
+    story_texts = soup.find_all("div", class_="story-text")
+
+    dialogues = []
+
+    for story in story_texts:
+        content_divs = story.find_all("div")
+
+        # 跳过空内容
+        if not content_divs:
+            continue
+
+        # 提取对话内容
+        if len(content_divs) == 1:
+            dialogue = content_divs[0].text.strip()
+            speaker = "旁白"
+        else:
+            speaker = content_divs[0].text.strip()
+            dialogue = content_divs[1].text.strip()
+
+        if dialogue:
+            dialogues.append({
+                "speaker": speaker,
+                "dialogue": dialogue
+            })
+
+    return dialogues
+
+
+def parse_english_dialogue(soup):
+    """从fandom页面（BeautifulSoup对象）中解析英文对话"""
+    # 找到包含对话的主要内容区域 - 英文使用表格结构
+    tables = soup.find_all("table", class_="wikitable")
+    if not tables:
+        print("未找到对话表格")
+        return []
+
+    dialogues = []
+    current_speaker = ""
+
+    # 遍历所有表格行
+    for table in tables:
+        rows = table.find_all("tr")
+        for row in rows:
+            # 跳过标题行
+            if row.find("td", colspan="5"):
+                continue
+
+            # 获取所有单元格
+            cells = row.find_all("td")
+
+            # 如果只有一个单元格且有colspan属性，这可能是旁白
+            if len(cells) == 1 and cells[0].has_attr("colspan"):
+                text = cells[0].text.strip()
+                if text and text not in ["Pre-Battle", "Post-Battle"]:
+                    dialogues.append({"english_speaker": "Narrator", "english_dialogue": text})
+                continue
+
+            # 正常的对话行应该有两个单元格：角色和对话内容
+            if len(cells) == 2:
+                # 第一个单元格包含角色信息
+                speaker_cell = cells[0]
+                # 尝试从单元格中提取角色名称
+                speaker_div = speaker_cell.find("div", style=lambda s: s and "align-self: flex-end" in s)
+                if speaker_div:
+                    speaker = speaker_div.text.strip()
+                else:
+                    speaker = "Unknown"
+
+                # 第二个单元格包含对话内容
+                dialogue = cells[1].text.strip()
+
+                if dialogue:
+                    if speaker:
+                        current_speaker = speaker
+                    dialogues.append({"english_speaker": current_speaker, "english_dialogue": dialogue})
+
+    return dialogues
+
+
+def parse_chinese_html(html):
+    """解析中文页面HTML字符串"""
+    return parse_chinese_dialogue(BeautifulSoup(html, "lxml"))
+
+
+def parse_english_html(html):
+    """解析英文页面HTML字符串"""
+    return parse_english_dialogue(BeautifulSoup(html, "lxml"))
+
+
+# 以下是基于lxml XPath的快速解析，输出与上面的BeautifulSoup版本完全一致，
+# 但不构建BeautifulSoup对象，只在需要的节点上取文本
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# BeautifulSoup的.text不包含注释以及script/style/template中的文字
+_TEXT = etree.XPath(".//text()[not(ancestor::script or ancestor::style or ancestor::template)]")
+_STORY_TEXTS = etree.XPath(f"//div[{_has_class('story-text')}]")
+_DIVS = etree.XPath(".//div")
+_TABLES = etree.XPath(f"//table[{_has_class('wikitable')}]")
+_ROWS = etree.XPath(".//tr")
+_TITLE_CELL = etree.XPath(".//td[@colspan='5']")
+_CELLS = etree.XPath(".//td")
+_SPEAKER_DIV = etree.XPath(".//div[contains(@style, 'align-self: flex-end')]")
+
+
+# BeautifulSoup会把只由空白组成的字符串压缩成一个换行或空格（pre/textarea中除外）
+_ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+_PRESERVE_WHITESPACE_TAGS = {"pre", "textarea"}
+
+
+def _preserves_whitespace(text_node):
+    container = text_node.getparent()
+    if text_node.is_tail:
+        container = container.getparent()
+    while container is not None:
+        if container.tag in _PRESERVE_WHITESPACE_TAGS:
+            return True
+        container = container.getparent()
+    return False
+
+
+def element_text(element, strip=False):
+    """与BeautifulSoup的.text（strip=True时为get_text(strip=True)）结果一致的lxml元素文本"""
+    if strip:
+        return "".join(text.strip() for text in _TEXT(element) if text.strip())
+    parts = []
+    for text in _TEXT(element):
+        if not text.strip(_ASCII_SPACES) and not _preserves_whitespace(text):
+            text = "\n" if "\n" in text else " "
+        parts.append(text)
+    return "".join(parts)
+
+
+def parse_document(html):
+    """用lxml解析HTML字符串或字节，返回文档根元素"""
+    if isinstance(html, str):
+        html = html.encode("utf-8")
+    parser = lxml.html.HTMLParser(encoding="utf-8")
+    return lxml.html.document_fromstring(html, parser=parser)
+
+
+def parse_chinese_html_fast(html):
+    """parse_chinese_dialogue的快速版本，直接接收HTML字符串"""
+    document = parse_document(html)
+    dialogues = []
+
+    for story in _STORY_TEXTS(document):
+        content_divs = _DIVS(story)
+
+        # 跳过空内容
+        if not content_divs:
+            continue
+
+        # 提取对话内容
+        if len(content_divs) == 1:
+            dialogue = element_text(content_divs[0]).strip()
+            speaker = "旁白"
+        else:
+            speaker = element_text(content_divs[0]).strip()
+            dialogue = element_text(content_divs[1]).strip()
+
+        if dialogue:
+            dialogues.append({
+                "speaker": speaker,
+                "dialogue": dialogue
+            })
+
+    return dialogues
+
+
+def parse_english_html_fast(html):
+    """parse_english_dialogue的快速版本，直接接收HTML字符串"""
+    document = parse_document(html)
+    tables = _TABLES(document)
+    if not tables:
+        print("未找到对话表格")
+        return []
+
+    dialogues = []
+    current_speaker = ""
+
+    for table in tables:
+        for row in _ROWS(table):
+            # 跳过标题行
+            if _TITLE_CELL(row):
+                continue
+
+            cells = _CELLS(row)
+
+            # 如果只有一个单元格且有colspan属性，这可能是旁白
+            if len(cells) == 1 and "colspan" in cells[0].attrib:
+                text = element_text(cells[0]).strip()
+                if text and text not in ["Pre-Battle", "Post-Battle"]:
+                    dialogues.append({"english_speaker": "Narrator", "english_dialogue": text})
+                continue
+
+            # 正常的对话行应该有两个单元格：角色和对话内容
+            if len(cells) == 2:
+                speaker_divs = _SPEAKER_DIV(cells[0])
+                if speaker_divs:
+                    speaker = element_text(speaker_divs[0]).strip()
+                else:
+                    speaker = "Unknown"
+
+                dialogue = element_text(cells[1]).strip()
+
+                if dialogue:
+                    if speaker:
+                        current_speaker = speaker
+                    dialogues.append({"english_speaker": current_speaker, "english_dialogue": dialogue})
+
+    return dialogues
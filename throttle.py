@@ -0,0 +1,134 @@
+import time
+import threading
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+
+# 自适应限流参数：并发窗口和请求间隔都按AIMD调整
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 8
+INITIAL_CONCURRENCY = 2
+
+MIN_INTERVAL = 1.0  # 同一站点两次请求开始之间的最短间隔（秒）
+MAX_INTERVAL = 60.0
+INITIAL_INTERVAL = 3.0
+INTERVAL_STEP = 0.25  # 响应正常时每次缩短的间隔
+
+# 响应时间超过该值视为服务器变慢
+SLOW_RESPONSE = 5.0
+
+# 连续失败多少次后熔断，熔断后暂停多久再试探
+FAILURE_THRESHOLD = 5
+COOLDOWN = 60.0
+MAX_COOLDOWN = 900.0
+
+
+class CircuitOpenError(Exception):
+    """站点处于熔断状态，请求直接失败"""
+
+
+def parse_retry_after(value):
+    """解析Retry-After头，支持秒数和HTTP日期，返回秒数"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_throttled_status(status):
+    """429和5xx表示服务器要求放慢"""
+    return status is None or status == 429 or status >= 500
+
+
+class HostThrottle:
+    """单个站点的自适应限流器
+
+    响应快且正常时加性增大并发窗口、缩短请求间隔；遇到429/5xx或响应变慢时
+    并发减半、间隔加倍。连续失败达到阈值后熔断，冷却期内请求直接失败，
+    冷却结束后只放行一个试探请求，成功则恢复，失败则冷却时间加倍。
+    """
+
+    def __init__(self, host):
+        self.host = host
+        self.concurrency = float(INITIAL_CONCURRENCY)
+        self.interval = INITIAL_INTERVAL
+        self.in_flight = 0
+        self.next_start = 0.0
+        self.failures = 0
+        self.cooldown = COOLDOWN
+        self.open_until = 0.0
+        self.probing = False
+        self.condition = threading.Condition()
+
+    def _circuit_open(self, now):
+        if self.failures < FAILURE_THRESHOLD:
+            return False
+        # 冷却结束后只放行一个试探请求，试探请求拿到名额时才标记（见acquire）
+        return now < self.open_until or self.probing
+
+    def acquire(self):
+        """等待直到可以发出请求；站点熔断时抛出CircuitOpenError"""
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                if self._circuit_open(now):
+                    remaining = max(0.0, self.open_until - now)
+                    raise CircuitOpenError(f"{self.host} 已熔断，{remaining:.0f} 秒后重试")
+                if self.in_flight < int(self.concurrency) and now >= self.next_start:
+                    self.in_flight += 1
+                    self.next_start = now + self.interval
+                    if self.failures >= FAILURE_THRESHOLD:
+                        self.probing = True
+                    return
+                timeout = max(0.05, self.next_start - now) if self.in_flight < int(self.concurrency) else None
+                self.condition.wait(timeout)
+
+    def release(self, status, latency, retry_after=None):
+        """请求结束后根据状态码、耗时和Retry-After调整限流参数"""
+        with self.condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            was_probe = self.probing
+            self.probing = False
+
+            if retry_after:
+                self.next_start = max(self.next_start, now + retry_after)
+
+            if is_throttled_status(status):
+                self.failures += 1
+                self.concurrency = max(MIN_CONCURRENCY, self.concurrency / 2)
+                self.interval = min(MAX_INTERVAL, self.interval * 2)
+                if self.failures >= FAILURE_THRESHOLD:
+                    if was_probe:
+                        self.cooldown = min(MAX_COOLDOWN, self.cooldown * 2)
+                    # Retry-After比冷却时间长时以它为准，冷却结束时试探请求即可发出
+                    self.open_until = max(now + self.cooldown, self.next_start)
+                    print(f"{self.host} 连续失败 {self.failures} 次，熔断 {self.open_until - now:.0f} 秒")
+            elif latency > SLOW_RESPONSE:
+                self.failures = 0
+                self.concurrency = max(MIN_CONCURRENCY, self.concurrency / 2)
+                self.interval = min(MAX_INTERVAL, self.interval * 2)
+            else:
+                self.failures = 0
+                self.cooldown = COOLDOWN
+                self.concurrency = min(MAX_CONCURRENCY, self.concurrency + 1 / self.concurrency)
+                self.interval = max(MIN_INTERVAL, self.interval - INTERVAL_STEP)
+            self.condition.notify_all()
+
+
+_throttles = {}
+_throttles_lock = threading.Lock()
+
+
+def get_throttle(url):
+    """获取URL所在站点的限流器"""
+    host = urlparse(url).netloc
+    with _throttles_lock:
+        if host not in _throttles:
+            _throttles[host] = HostThrottle(host)
+        return _throttles[host]